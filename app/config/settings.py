@@ -42,15 +42,79 @@ class Settings(BaseSettings):
     # Vector Store
     vector_store_path: str = "./data/vectorstore"
     collection_name: str = "ecomarket_docs"
+    # Prebuilt index snapshot (python -m app.rag.build_index) loaded at startup
+    index_snapshot_path: Optional[str] = None
+    enable_query_router: bool = False
+
+    # Ingestion
+    chunk_size: int = 1000
+    chunk_overlap: int = 200
+    ingestion_batch_size: int = 256
+    # Worker processes for re-index embedding (0 = embed in-process)
+    embedding_workers: int = 0
+    embedding_worker_threads: int = 0
+    embedding_worker_shard_size: int = 64
+    # Drop chunks repeating indexed content (exact, and near duplicates via MinHash/LSH)
+    enable_chunk_dedup: bool = True
+    dedup_near_duplicates: bool = False
+    # Estimated Jaccard similarity of word 3-grams from which chunks are near duplicates
+    dedup_similarity_threshold: float = 0.9
     
     # RAG Parameters
     top_k_documents: int = 4
     max_context_length: int = 4000
     temperature: float = 0.7
+
+    # Request handling
+    enable_request_coalescing: bool = True
+    max_concurrent_requests: int = 16
+    max_queued_requests: int = 64
+    queue_timeout_seconds: float = 2.0
+    request_timeout_seconds: float = 30.0
+    retry_after_seconds: int = 1
+    embedding_concurrency: int = 4
+    search_concurrency: int = 8
+    llm_concurrency: int = 8
+    
+    # Caches (0 disables a cache)
+    embedding_cache_size: int = 4096
+    retrieval_cache_size: int = 1024
+    answer_cache_size: int = 0
+    
+    # Cache warm-up
+    warmup_queries_path: Optional[str] = None
+    warmup_max_queries: int = 200
+    warmup_concurrency: int = 4
+    warmup_include_answers: bool = False
+    warmup_blocking: bool = False
+    warmup_export_path: Optional[str] = None
+    
+    # LLM resilience
+    llm_max_attempts: int = 3
+    llm_attempt_timeout_seconds: float = 20.0
+    llm_backoff_base_seconds: float = 0.25
+    llm_backoff_max_seconds: float = 8.0
+    llm_hedging_enabled: bool = False
+    llm_hedge_quantile: float = 0.95
+    llm_hedge_min_samples: int = 20
+    llm_circuit_failure_threshold: int = 5
+    llm_circuit_reset_seconds: float = 30.0
+    
+    # Diagnostics
+    # Exposes /debug/memory; keep disabled on public deployments
+    enable_debug_endpoints: bool = False
+    # Trace allocations while the retriever loads or indexes documents (slow)
+    profile_ingestion: bool = False
+    profile_top_n: int = 15
     
     # Logging
     log_level: str = "INFO"
     log_file: Optional[str] = "logs/ecomarket_rag.log"
+    log_json: bool = False
+    log_enqueue: bool = True
+    log_rotation: str = "50 MB"
+    # Sampling of per-request (hot path) lines, e.g. "DEBUG=0.01,INFO=0.1"
+    log_sample_rates: str = ""
     
     class Config:
         env_file = ".env"
@@ -0,0 +1,286 @@
+"""
+Admission Control Module
+Bounded admission queue, per-stage concurrency limits and request deadlines
+"""
+
+import asyncio
+import functools
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, Optional
+
+from loguru import logger
+
+
+class OverloadedError(Exception):
+    """Raised when the server is saturated and the request is shed"""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class DeadlineExceededError(Exception):
+    """Raised when a request runs past its deadline"""
+
+
+class ClientDisconnectedError(Exception):
+    """Raised when the client went away before the response was ready"""
+
+
+async def acquire_within(semaphore: asyncio.Semaphore, timeout: Optional[float]) -> bool:
+    """
+    Acquire a semaphore, giving up after timeout seconds
+
+    Unlike asyncio.wait_for(semaphore.acquire(), timeout), which can lose a
+    permit before Python 3.12 when the timeout fires as the acquire
+    completes, a permit granted in that race is handed back.
+
+    Args:
+        semaphore: Semaphore to acquire
+        timeout: Seconds to wait, None to wait indefinitely
+
+    Returns:
+        Whether the semaphore was acquired
+    """
+    acquire = asyncio.ensure_future(semaphore.acquire())
+    try:
+        await asyncio.wait({acquire}, timeout=timeout)
+    except asyncio.CancelledError:
+        _abandon_acquire(semaphore, acquire)
+        raise
+    if acquire.done() and not acquire.cancelled() and acquire.exception() is None:
+        return True
+    _abandon_acquire(semaphore, acquire)
+    return False
+
+
+def _abandon_acquire(semaphore: asyncio.Semaphore, acquire: asyncio.Future):
+    if not acquire.done():
+        # Semaphore.acquire returns a permit granted before the cancellation lands
+        acquire.cancel()
+    elif not acquire.cancelled() and acquire.exception() is None:
+        semaphore.release()
+
+
+class Deadline:
+    """
+    Absolute per-request deadline propagated through the pipeline stages
+    """
+
+    def __init__(self, timeout: Optional[float]):
+        """
+        Initialize the deadline
+
+        Args:
+            timeout: Seconds from now, None or <= 0 for no deadline
+        """
+        self.expires_at = time.monotonic() + timeout if timeout and timeout > 0 else None
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left before the deadline, None when unbounded"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        """Whether the deadline has passed"""
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def check(self, stage: str):
+        """Raise DeadlineExceededError if the deadline passed before stage starts"""
+        if self.expired:
+            raise DeadlineExceededError(f"Deadline exceeded before {stage}")
+
+
+class AdmissionController:
+    """
+    Limits concurrently executing requests behind a bounded waiting queue
+
+    Requests beyond max_concurrency wait for a slot; once max_queue requests
+    are already waiting, or a slot does not free up within queue_timeout,
+    the request is rejected immediately with OverloadedError.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int,
+                 queue_timeout: float = 2.0, retry_after: int = 1):
+        """
+        Initialize the admission controller
+
+        Args:
+            max_concurrency: Requests allowed to execute at the same time
+            max_queue: Requests allowed to wait for a slot
+            queue_timeout: Maximum seconds a request waits for a slot
+            retry_after: Seconds suggested to rejected clients
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    def _reject(self, reason: str):
+        self.rejected += 1
+        logger.warning("Request shed: {} (active={}, waiting={})", reason, self.active, self.waiting)
+        raise OverloadedError(f"Server overloaded: {reason}", retry_after=self.retry_after)
+
+    @asynccontextmanager
+    async def admit(self, deadline: Optional[Deadline] = None):
+        """
+        Hold an execution slot for the duration of the block
+
+        Args:
+            deadline: Request deadline, bounds the time spent queued
+        """
+        if not self._semaphore.locked():
+            # Free slot: acquire returns without suspending
+            await self._semaphore.acquire()
+        else:
+            if self.waiting >= self.max_queue:
+                self._reject("admission queue full")
+            timeout = self.queue_timeout
+            remaining = deadline.remaining() if deadline else None
+            if remaining is not None:
+                timeout = min(timeout, remaining)
+            self.waiting += 1
+            try:
+                acquired = await acquire_within(self._semaphore, timeout)
+            finally:
+                self.waiting -= 1
+            if not acquired:
+                self._reject("timed out waiting for an execution slot")
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, int]:
+        """Counters exposed for health/diagnostics"""
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+        }
+
+
+class StageLimiter:
+    """
+    Per-stage concurrency limits (embedding, search, llm) with the request
+    deadline enforced
+
+    Blocking stages go through run, which executes them off the event loop;
+    a thread cannot be interrupted, so work abandoned by a cancelled or
+    timed out request still runs to completion. Async stages such as the
+    llm calls hold a slot with slot(), and cancelling them stops the work.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, int]] = None):
+        """
+        Initialize the stage limiter
+
+        Args:
+            limits: Maximum concurrent executions per stage name; stages
+                without a positive limit are unbounded
+        """
+        self._semaphores = {
+            stage: asyncio.Semaphore(limit)
+            for stage, limit in (limits or {}).items()
+            if limit and limit > 0
+        }
+
+    async def run(self, stage: str, fn: Callable[..., Any], *args,
+                  deadline: Optional[Deadline] = None, **kwargs) -> Any:
+        """
+        Run a blocking callable for a stage in the default executor
+
+        The stage slot is held until the callable actually returns, so work
+        abandoned after a deadline still counts against the limit.
+
+        Args:
+            stage: Stage name
+            fn: Blocking callable
+            deadline: Request deadline
+
+        Returns:
+            Result of fn
+        """
+        if deadline:
+            deadline.check(stage)
+        semaphore = await self._acquire(stage, deadline)
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(None, functools.partial(fn, *args, **kwargs))
+        future.add_done_callback(functools.partial(self._on_done, semaphore))
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), deadline.remaining() if deadline else None)
+        except asyncio.TimeoutError:
+            raise DeadlineExceededError(f"Deadline exceeded during {stage}")
+
+    async def _acquire(self, stage: str, deadline: Optional[Deadline]) -> Optional[asyncio.Semaphore]:
+        semaphore = self._semaphores.get(stage)
+        if semaphore is not None and not await acquire_within(semaphore, deadline.remaining() if deadline else None):
+            raise DeadlineExceededError(f"Deadline exceeded waiting for {stage} slot")
+        return semaphore
+
+    @asynccontextmanager
+    async def slot(self, stage: str, deadline: Optional[Deadline] = None):
+        """
+        Hold a stage slot for async work in the block
+
+        The slot is released when the block exits, including when it is
+        cancelled, so the work must stop with it (e.g. an async HTTP call).
+
+        Args:
+            stage: Stage name
+            deadline: Request deadline, bounds the wait for a slot
+        """
+        if deadline:
+            deadline.check(stage)
+        semaphore = await self._acquire(stage, deadline)
+        try:
+            yield
+        finally:
+            if semaphore is not None:
+                semaphore.release()
+
+    @staticmethod
+    def _on_done(semaphore: Optional[asyncio.Semaphore], future: asyncio.Future):
+        if semaphore is not None:
+            semaphore.release()
+        if not future.cancelled():
+            # Mark the exception as retrieved when the caller already gave up
+            future.exception()
+
+
+async def run_until_disconnect(http_request, awaitable, poll_interval: float = 0.1) -> Any:
+    """
+    Await a coroutine, cancelling it if the HTTP client disconnects
+
+    Args:
+        http_request: Starlette request of the caller
+        awaitable: Work producing the response
+        poll_interval: Seconds between disconnect checks
+
+    Returns:
+        Result of the awaitable
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await http_request.is_disconnected():
+                logger.info("Client disconnected, cancelling request")
+                raise ClientDisconnectedError("Client closed request")
+    finally:
+        if not task.done():
+            task.cancel()
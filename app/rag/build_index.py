@@ -0,0 +1,92 @@
+"""
+Index Build CLI
+Runs the local-folder and blob ingestion offline and writes an index snapshot
+
+Usage:
+    python -m app.rag.build_index --output ./data/index_snapshot [--skip-blob] [--workers 4]
+"""
+
+import argparse
+import sys
+import time
+from contextlib import nullcontext
+from typing import List, Optional
+
+from loguru import logger
+
+from app.config.settings import get_settings
+from app.rag.embeddings import EmbeddingService
+from app.rag.embeddings_hugging_face import EmbeddingHuggingFaceService
+from app.rag.parallel_embeddings import ParallelEmbeddingExecutor, backend_for
+from app.rag.retriever import DocumentRetriever
+from utils.memory import AllocationProfiler
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Build a portable EcoMarket index snapshot")
+    parser.add_argument("--output", default=settings.index_snapshot_path or "./data/index_snapshot",
+                        help="Snapshot directory to write (replaced if it exists)")
+    parser.add_argument("--docs-folder", default=None, help="Local PDF folder (defaults to ./docs)")
+    parser.add_argument("--skip-blob", action="store_true", help="Do not ingest from Azure Blob Storage")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2", help="Embedding model name")
+    parser.add_argument("--backend", choices=["sentence-transformers", "huggingface"],
+                        default="sentence-transformers", help="Embedding backend")
+    parser.add_argument("--workers", type=int, default=settings.embedding_workers,
+                        help="Embedding worker processes (0 = in-process)")
+    parser.add_argument("--worker-threads", type=int, default=settings.embedding_worker_threads,
+                        help="Torch threads per worker (0 = cores / workers)")
+    parser.add_argument("--profile-memory", action="store_true", default=settings.profile_ingestion,
+                        help="Log the top allocation sites of the ingestion (tracemalloc, slow)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Build the index and write the snapshot, returning the process exit code"""
+    args = parse_args(argv)
+    settings = get_settings()
+    started = time.perf_counter()
+
+    if args.backend == "huggingface":
+        embedding_service = EmbeddingHuggingFaceService(args.model)
+    else:
+        embedding_service = EmbeddingService(args.model)
+
+    ingestion_embedder = None
+    if args.workers > 0:
+        ingestion_embedder = ParallelEmbeddingExecutor(
+            embedding_service.model_name,
+            backend=backend_for(embedding_service),
+            num_workers=args.workers,
+            threads_per_worker=args.worker_threads or None,
+            shard_size=settings.embedding_worker_shard_size
+        )
+    try:
+        retriever = DocumentRetriever(
+            embedding_service,
+            collection_name=settings.collection_name,
+            ingestion_embedder=ingestion_embedder,
+            use_snapshot=False,
+            index_on_init=False
+        )
+        profiler = AllocationProfiler("ingestion", top_n=settings.profile_top_n) if args.profile_memory else None
+        with profiler or nullcontext():
+            retriever.build_index(docs_folder=args.docs_folder, include_blob=not args.skip_blob)
+    finally:
+        if ingestion_embedder is not None:
+            ingestion_embedder.close()
+
+    if retriever.collection.count() == 0:
+        logger.error("No chunks were indexed, snapshot not written")
+        return 1
+    manifest = retriever.export_snapshot(args.output)
+    logger.info(
+        "Index snapshot built in {:.1f}s: {} chunks, dim {}, model {} -> {}",
+        time.perf_counter() - started, manifest["count"], manifest["embedding_dim"],
+        manifest["model_name"], args.output
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
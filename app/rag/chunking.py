@@ -0,0 +1,148 @@
+"""
+Chunking Module
+Streaming, page-aware splitting of documents into chunks
+"""
+
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Tuple
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+
+@dataclass
+class TextChunk:
+    """A chunk of a document with its provenance"""
+    index: int
+    text: str
+    char_start: int
+    char_end: int
+    page_start: int
+    page_end: int
+
+
+def iter_pdf_pages(pdf_path: str) -> Iterator[Tuple[int, str]]:
+    """
+    Yield (page_number, text) for each page of a PDF, one page at a time
+
+    Args:
+        pdf_path: Path of the PDF file
+    """
+    from pypdf import PdfReader
+    reader = PdfReader(pdf_path)
+    for number, page in enumerate(reader.pages, 1):
+        yield number, page.extract_text() or ""
+
+
+class StreamingChunker:
+    """
+    Splits a stream of pages into chunks with bounded memory
+
+    Pages are appended to a window of about window_chunks * chunk_size
+    characters. When the window is full it is split with the same
+    RecursiveCharacterTextSplitter settings used before; chunks that end well
+    before the window edge are emitted and the window is re-split from the
+    start of the first chunk not yet emitted, which is a separator boundary.
+
+    Character offsets refer to the pages joined with "\\n", and every chunk is
+    exactly that text at its offsets. Boundaries match splitting the joined
+    text in one go when it splits at a single separator level into pieces
+    shorter than chunk_size, e.g. "\\n\\n"-separated paragraphs. Otherwise a
+    window may be split at a finer separator than the whole text would be,
+    so boundaries can differ, still covering all the text with chunks of at
+    most chunk_size characters.
+    """
+
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200, window_chunks: int = 8):
+        """
+        Initialize the chunker
+
+        Args:
+            chunk_size: Maximum characters per chunk
+            chunk_overlap: Characters shared by consecutive chunks
+            window_chunks: Window size, in chunks, buffered before splitting
+        """
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.window_size = chunk_size * max(2, window_chunks)
+        self.splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap
+        )
+
+    def _split(self, text: str) -> List[Tuple[str, int]]:
+        # The splitter's own start_index searches from the previous chunk's end
+        # minus chunk_overlap, which finds an earlier copy of short repeated
+        # chunks. Each chunk starts after the previous one and ends past it.
+        parts = []
+        prev_start, prev_end = -1, 0
+        for part in self.splitter.split_text(text):
+            start = text.find(part, max(prev_start + 1, prev_end - len(part) + 1))
+            if start < 0:
+                start = text.find(part, prev_start + 1)
+            parts.append((part, start))
+            prev_start, prev_end = start, start + len(part)
+        return parts
+
+    def chunk_pages(self, pages: Iterable[Tuple[int, str]]) -> Iterator[TextChunk]:
+        """
+        Chunk a stream of pages
+
+        Args:
+            pages: Iterable of (page_number, text), e.g. iter_pdf_pages()
+
+        Yields:
+            TextChunk with page numbers and character offsets
+        """
+        buffer = ""
+        buffer_start = 0
+        # Global offset at which each page still overlapping the buffer starts
+        page_offsets: List[int] = []
+        page_numbers: List[int] = []
+        index = 0
+        doc_length = 0
+
+        def make_chunk(text: str, start: int) -> TextChunk:
+            char_start = buffer_start + start
+            char_end = char_start + len(text)
+            first_page = page_numbers[max(0, bisect_right(page_offsets, char_start) - 1)]
+            last_page = page_numbers[max(0, bisect_right(page_offsets, char_end - 1) - 1)]
+            return TextChunk(index, text, char_start, char_end, first_page, last_page)
+
+        for number, text in pages:
+            if page_offsets:
+                buffer += "\n"
+                doc_length += 1
+            page_offsets.append(doc_length)
+            page_numbers.append(number)
+            buffer += text
+            doc_length += len(text)
+            if len(buffer) < self.window_size:
+                continue
+
+            parts = self._split(buffer)
+            # Chunks ending this close to the window edge may still grow with the next page
+            safe_end = len(buffer) - self.chunk_size
+            resume = None
+            for text_part, start in parts[:-1]:
+                if start + len(text_part) > safe_end:
+                    resume = start
+                    break
+                yield make_chunk(text_part, start)
+                index += 1
+            if resume is None:
+                resume = parts[-1][1] if parts else len(buffer)
+            # Chunks are stripped: restart at the separator before the chunk so
+            # it counts towards the chunk's length as in the unstripped split
+            resume = len(buffer[:resume].rstrip())
+            buffer = buffer[resume:]
+            buffer_start += resume
+            # Drop pages that end before the buffer, keeping the one it starts in
+            first_kept = max(0, bisect_right(page_offsets, buffer_start) - 1)
+            del page_offsets[:first_kept]
+            del page_numbers[:first_kept]
+
+        if buffer.strip():
+            for text_part, start in self._split(buffer):
+                yield make_chunk(text_part, start)
+                index += 1
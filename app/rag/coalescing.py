@@ -0,0 +1,112 @@
+"""
+Request Coalescing Module
+Single-flight execution of identical in-flight queries
+"""
+
+import asyncio
+import json
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from loguru import logger
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query so trivially different spellings share a key"""
+    return " ".join(query.casefold().split())
+
+
+def make_query_key(query: str, **params: Any) -> str:
+    """
+    Build a coalescing key from the normalized query and its parameters
+
+    Args:
+        query: User query
+        **params: Parameters that change the pipeline result (top_k, filters...)
+
+    Returns:
+        Stable string key
+    """
+    return json.dumps(
+        {"query": normalize_query(query), "params": params},
+        sort_keys=True,
+        default=str,
+        ensure_ascii=False,
+    )
+
+
+class _Flight:
+    """Shared execution and the number of callers awaiting it"""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one execution
+
+    The first caller for a key starts the work; callers arriving while it is
+    still running await the same task and receive the same result or exception.
+    Nothing is kept once the task finishes, so this is not a cache.
+    """
+
+    def __init__(self):
+        """Initialize the in-flight registry"""
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    @property
+    def in_flight(self) -> int:
+        """Number of distinct executions currently running"""
+        return len(self._flights)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run fn once for all concurrent callers sharing key
+
+        Args:
+            key: Coalescing key
+            fn: Coroutine function producing the result
+
+        Returns:
+            Result of the shared execution
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            task = asyncio.ensure_future(fn())
+            flight = _Flight(task)
+            self._flights[key] = flight
+            task.add_done_callback(lambda _, key=key, flight=flight: self._forget(key, flight))
+            self.executions += 1
+        else:
+            self.coalesced += 1
+            logger.debug("Coalesced request onto in-flight execution ({} waiting)", flight.waiters)
+
+        flight.waiters += 1
+        try:
+            # Shield so one caller going away does not cancel the others' work
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                # Last interested caller left: stop the shared work as well
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def _forget(self, key: Hashable, flight: _Flight):
+        """Drop a finished flight so the next call starts fresh"""
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def stats(self) -> Dict[str, int]:
+        """Counters exposed for health/diagnostics"""
+        return {
+            "in_flight": self.in_flight,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+        }
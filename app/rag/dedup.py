@@ -0,0 +1,191 @@
+"""
+Chunk Deduplication Module
+Drops exact and near-duplicate chunks at ingestion using content hashes and MinHash/LSH
+"""
+
+import hashlib
+import re
+from collections import defaultdict
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+_NUMBER_PATTERN = re.compile(r"\d+(?:[.,]\d+)*")
+
+
+def content_hash(text: str) -> str:
+    """Hash of a chunk's text, insensitive to whitespace and case"""
+    normalized = " ".join(text.split()).casefold()
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+def numeric_tokens(text: str) -> Tuple[str, ...]:
+    """Numbers of a text, in order; chunks differing in them are never near duplicates"""
+    return tuple(_NUMBER_PATTERN.findall(text))
+
+
+def shingles(text: str, size: int = 3) -> List[str]:
+    """Word n-grams of a text (the whole text when it is shorter than size words)"""
+    tokens = _TOKEN_PATTERN.findall(text.casefold())
+    if len(tokens) <= size:
+        return [" ".join(tokens)] if tokens else []
+    return [" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)]
+
+
+class MinHasher:
+    """
+    MinHash signatures from a family of multiply-shift hash functions
+
+    The fraction of equal positions in two signatures estimates the Jaccard
+    similarity of the underlying shingle sets.
+    """
+
+    def __init__(self, num_perm: int = 128, shingle_size: int = 3, seed: int = 1):
+        """
+        Initialize the hasher
+
+        Args:
+            num_perm: Signature length
+            shingle_size: Words per shingle
+            seed: Seed of the hash family; signatures are only comparable
+                between hashers built with the same seed and num_perm
+        """
+        rng = np.random.default_rng(seed)
+        # Odd multipliers make x -> (a * x + b) mod 2**64 a bijection
+        self._a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash signature of a text"""
+        values = shingles(text, self.shingle_size)
+        if not values:
+            return np.full(self.num_perm, np.iinfo(np.uint32).max, dtype=np.uint32)
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=4).digest(), "little")
+             for value in set(values)),
+            dtype=np.uint64
+        )
+        with np.errstate(over="ignore"):
+            permuted = (np.outer(hashes, self._a) + self._b) >> np.uint64(32)
+        return permuted.min(axis=0).astype(np.uint32)
+
+
+class ChunkDeduplicator:
+    """
+    Finds chunks that repeat content already indexed
+
+    Exact duplicates are found by content hash. Near duplicates are found
+    with MinHash signatures bucketed by locality-sensitive hashing: bands of
+    the signature are hashed and chunks sharing a band are compared, so each
+    new chunk is checked against a handful of candidates instead of the
+    whole index. Near duplicates must also contain the same numbers, so
+    chunks that differ only in a term, price or date are both kept.
+
+    Chunks are only compared within their partition: a chunk shared by two
+    partitions is kept once in each, so filtering on either finds it.
+    """
+
+    def __init__(self, threshold: float = 0.9, num_perm: int = 128, bands: int = 16,
+                 shingle_size: int = 3, near_duplicates: bool = False):
+        """
+        Initialize the deduplicator
+
+        Args:
+            threshold: Estimated Jaccard similarity from which a chunk is a
+                near duplicate
+            num_perm: MinHash signature length
+            bands: LSH bands; num_perm must be a multiple of it. More bands
+                find more candidates at lower similarities.
+            shingle_size: Words per shingle
+            near_duplicates: Also drop near duplicates, not only exact ones
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.near_duplicates = near_duplicates
+        self.hasher = MinHasher(num_perm=num_perm, shingle_size=shingle_size)
+        self._hashes: Dict[Tuple[Hashable, str], str] = {}
+        self._signatures: Dict[str, np.ndarray] = {}
+        self._numbers: Dict[str, Tuple[str, ...]] = {}
+        self._buckets: Dict[Tuple[Hashable, int, bytes], List[str]] = defaultdict(list)
+        self.kept = 0
+        self.exact_duplicates = 0
+        self.near_duplicates_found = 0
+
+    def check(self, chunk_id: str, text: str, partition: Hashable = None) -> Optional[str]:
+        """
+        Register a chunk, or find the indexed chunk it duplicates
+
+        Args:
+            chunk_id: Id the chunk will be indexed under if it is kept
+            text: Chunk text
+            partition: Partition of the chunk (e.g. its category and
+                language); only chunks of the same partition are duplicates
+
+        Returns:
+            Id of the kept chunk with the same content, None if the chunk is new
+        """
+        digest = (partition, content_hash(text))
+        original = self._hashes.get(digest)
+        if original is not None:
+            self.exact_duplicates += 1
+            return original
+
+        signature = numbers = None
+        if self.near_duplicates:
+            signature = self.hasher.signature(text)
+            numbers = numeric_tokens(text)
+            original = self._near_duplicate_of(signature, numbers, partition)
+            if original is not None:
+                self.near_duplicates_found += 1
+                return original
+
+        self._hashes[digest] = chunk_id
+        if signature is not None:
+            self._signatures[chunk_id] = signature
+            self._numbers[chunk_id] = numbers
+            for band in self._bands(signature, partition):
+                self._buckets[band].append(chunk_id)
+        self.kept += 1
+        return None
+
+    def _bands(self, signature: np.ndarray, partition: Hashable):
+        for band in range(self.bands):
+            yield partition, band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def _near_duplicate_of(self, signature: np.ndarray, numbers: Tuple[str, ...],
+                           partition: Hashable) -> Optional[str]:
+        best_id, best_similarity = None, self.threshold
+        seen = set()
+        for band in self._bands(signature, partition):
+            for candidate in self._buckets.get(band, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                if self._numbers[candidate] != numbers:
+                    continue
+                similarity = float(np.mean(self._signatures[candidate] == signature))
+                if similarity >= best_similarity:
+                    best_id, best_similarity = candidate, similarity
+        return best_id
+
+    def clear(self):
+        """Forget the registered chunks once ingestion is over, keeping the counters"""
+        self._hashes.clear()
+        self._signatures.clear()
+        self._numbers.clear()
+        self._buckets.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Counters of kept and dropped chunks"""
+        return {
+            "kept": self.kept,
+            "exact_duplicates": self.exact_duplicates,
+            "near_duplicates": self.near_duplicates_found,
+        }
@@ -23,6 +23,7 @@ class EmbeddingService:
             model_name: Name of the sentence transformer model
         """
         logger.info(f"Initializing embedding service with model: {model_name}")
+        self.model_name = model_name
         self.model = SentenceTransformer(model_name)
         self.embedding_dim = self.model.get_sentence_embedding_dimension()
         logger.info(f"Embedding dimension: {self.embedding_dim}")
@@ -24,6 +24,7 @@ class EmbeddingHuggingFaceService:
         """
         logger.info(f"Initializing embedding service with Hugging Face model: {model_name}")
         from transformers import AutoTokenizer, AutoModel
+        self.model_name = model_name
         self.tokenizer = AutoTokenizer.from_pretrained(model_name)
         self.model = AutoModel.from_pretrained(model_name)
         self.model.eval()
@@ -3,40 +3,96 @@ Response Generator Module
 Generates responses using LLM based on retrieved documents
 """
 
+import asyncio
+import json
 import os
 #import openai
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncIterator, Callable, Optional
 from loguru import logger
 from streamlit import context
 from app.config import settings
 from app.config.settings import get_settings
+from app.rag.admission import Deadline, DeadlineExceededError, StageLimiter
+from app.rag.resilience import CircuitBreaker, ResilientCaller, RetryPolicy
+from utils.logging_config import hot_logger
 from azure.ai.inference.models import SystemMessage, UserMessage
 
+
+def count_tokens(text: str, model: str = "gpt-4o") -> int:
+    """
+    Count prompt tokens with tiktoken when installed, else estimate ~4 chars/token
+
+    Args:
+        text: Prompt text
+        model: Model name used to pick the tokenizer
+
+    Returns:
+        Number of tokens
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        return max(1, len(text) // 4) if text else 0
+    try:
+        encoding = tiktoken.encoding_for_model(model)
+    except KeyError:
+        encoding = tiktoken.get_encoding("o200k_base")
+    return len(encoding.encode(text))
+
+
 class ResponseGenerator:
     """
     Generates responses using OpenAI LLM with retrieved context
     """
     
-    def __init__(self):
-        """Initialize the response generator"""
+    def __init__(self, stage_limiter: Optional[StageLimiter] = None):
+        """
+        Initialize the response generator
+
+        Args:
+            stage_limiter: Concurrency limit for the llm stage
+        """
         logger.info("Initializing response generator")
         settings = get_settings()
+        self.stage_limiter = stage_limiter or StageLimiter()
         self.client = self.init_client()
         self.model = settings.azure_openai_deployment_name or "gpt-4.1-mini"
+        self.resilient_caller = ResilientCaller(
+            retry_policy=RetryPolicy(
+                max_attempts=settings.llm_max_attempts,
+                attempt_timeout=settings.llm_attempt_timeout_seconds,
+                base_delay=settings.llm_backoff_base_seconds,
+                max_delay=settings.llm_backoff_max_seconds
+            ),
+            circuit_breaker=CircuitBreaker(
+                failure_threshold=settings.llm_circuit_failure_threshold,
+                reset_timeout=settings.llm_circuit_reset_seconds
+            ),
+            hedge_quantile=settings.llm_hedge_quantile if settings.llm_hedging_enabled else None,
+            hedge_min_samples=settings.llm_hedge_min_samples
+        )
+        # Fixed, byte-stable system prefix: identical on every request so the
+        # provider's prompt cache can reuse it. Per-request data goes in the user turn.
+        self.system_prompt = self._create_system_prompt()
+        self.system_prompt_tokens = count_tokens(self.system_prompt, self.model)
 
     def init_client(self):
         """Inicializa el cliente de Azure OpenAI."""
         import os
-        from openai import AzureOpenAI, api_version
+        from openai import AsyncAzureOpenAI
         settings = get_settings()
         endpoint = settings.azure_openai_endpoint
         subscription_key = settings.azure_openai_key
         api_version = settings.azure_openai_api_version
 
-        return AzureOpenAI(
+        # Async client: cancelling a request (deadline, hedge, client
+        # disconnect) closes its HTTP call instead of leaving it running
+        return AsyncAzureOpenAI(
             api_version=api_version,
             azure_endpoint=endpoint,
             api_key=subscription_key,
+            # Retries are handled by ResilientCaller, avoid compounding them
+            max_retries=0,
         )
     
     def get_prompt(self, name):
@@ -54,7 +110,9 @@ class ResponseGenerator:
    
      
     async def generate(self, query: str, documents: List[Dict[str, Any]], 
-                      temperature: float = 0.7) -> Dict[str, Any]:
+                      temperature: float = 0.7,
+                      deadline: Optional[Deadline] = None,
+                      on_text: Optional[Callable[[str], Any]] = None) -> Dict[str, Any]:
         """
         Generate response using LLM with document context
         
@@ -62,35 +120,51 @@ class ResponseGenerator:
             query: User query
             documents: Retrieved documents
             temperature: LLM temperature parameter
+            deadline: Request deadline, also used as the upstream HTTP timeout
+            on_text: Called with each text delta as it is generated; the
+                answer is then streamed with generate_stream
             
         Returns:
             Dict containing answer, sources, and confidence
         """
         try:
-            logger.info(f"Generating response for query: {query[:50]}...")
+            hot_logger.debug("Generating response for query: {:.50}...", query)
             # Build context from documents
             context = self._build_context(documents)
-            logger.info(f"Context from documents: {context[:100]}...")
-            # Create prompt
+            hot_logger.debug("Context from documents: {:.100}...", context)
+            # Create prompt: stable system prefix + variable tail with context and question
             prompt = self._create_prompt_improved(query, context)
-            logger.info(f"Prompt created: {prompt[:100]}...")         
+            hot_logger.debug("Prompt created: {:.100}...", prompt)
             # Prepare messages for chat completion
             messages = [
-                        SystemMessage(content=prompt),
-                        UserMessage(content=query)
+                        SystemMessage(content=self.system_prompt),
+                        UserMessage(content=prompt)
                  ]
-            
-            logger.info("Prepare messages for chat completion")
 
-            # Call OpenAI API          
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=temperature
-            )
+            # Call OpenAI API with retries/hedging bounded by the request deadline
+            async def call_llm(timeout: Optional[float]):
+                request_options = {"timeout": timeout} if timeout is not None else {}
+                async with self.stage_limiter.slot("llm", deadline):
+                    return await self.client.chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        temperature=temperature,
+                        **request_options
+                    )
+
+            if on_text is not None:
+                parts = []
+                async for text in self.generate_stream(query, documents, temperature=temperature, deadline=deadline):
+                    on_text(text)
+                    parts.append(text)
+                answer = "".join(parts)
+                # Streamed responses carry no usage: it is estimated from the prompt
+                response = None
+            else:
+                response = await self.resilient_caller.call(call_llm, deadline=deadline)
             
-            # Extract answer
-            answer = response.choices[0].message['content'] if isinstance(response.choices[0].message, dict) else response.choices[0].message.content
+                # Extract answer
+                answer = response.choices[0].message['content'] if isinstance(response.choices[0].message, dict) else response.choices[0].message.content
 
             # Extract sources
             sources = self._format_sources(documents)
@@ -98,47 +172,161 @@ class ResponseGenerator:
             # Calculate confidence (simplified)
             confidence = self._calculate_confidence(documents)
 
-            logger.info("Response generated successfully")
+            usage = self._extract_usage(response, prompt)
+            hot_logger.info(
+                "Response generated successfully (prompt_tokens={}, cached_tokens={})",
+                usage["prompt_tokens"], usage["cached_tokens"]
+            )
             return {
                 "answer": answer,
                 "sources": sources,
-                "confidence": confidence
+                "confidence": confidence,
+                "usage": usage
             }
             
         except Exception as e:
-            logger.error(f"Error generating response: {str(e)}")
+            logger.error("Error generating response: {}", e)
             raise
+
+    async def generate_stream(self, query: str, documents: List[Dict[str, Any]],
+                              temperature: float = 0.7,
+                              deadline: Optional[Deadline] = None) -> AsyncIterator[str]:
+        """
+        Generate a response as a stream of text deltas
+
+        Uses the same prompt layout as generate. Retries, hedging and the
+        circuit breaker cover opening the stream; a failure after text has
+        been yielded is raised to the caller. The llm stage slot is held
+        until the stream ends, and every read is bounded by the deadline.
+
+        Args:
+            query: User query
+            documents: Retrieved documents
+            temperature: LLM temperature parameter
+            deadline: Request deadline, also used as the upstream HTTP timeout
+
+        Yields:
+            Answer text as it is generated
+
+        Raises:
+            DeadlineExceededError: The deadline passed while streaming; the
+                upstream stream is closed
+        """
+        context = self._build_context(documents)
+        prompt = self._create_prompt_improved(query, context)
+        messages = [
+            SystemMessage(content=self.system_prompt),
+            UserMessage(content=prompt)
+        ]
+
+        async def open_stream(timeout: Optional[float]):
+            request_options = {"timeout": timeout} if timeout is not None else {}
+            return await self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=temperature,
+                stream=True,
+                **request_options
+            )
+
+        # One slot for the whole stream: the upstream is generating until it ends
+        async with self.stage_limiter.slot("llm", deadline):
+            stream = await self.resilient_caller.call(open_stream, deadline=deadline)
+            chunks = stream.__aiter__()
+            try:
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), deadline.remaining() if deadline else None)
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        raise DeadlineExceededError("Deadline exceeded while streaming the llm response") from None
+                    if not chunk.choices:
+                        # Azure sends content filter results in chunks without choices
+                        continue
+                    delta = chunk.choices[0].delta
+                    text = delta.get('content') if isinstance(delta, dict) else getattr(delta, 'content', None)
+                    if text:
+                        yield text
+            finally:
+                await stream.close()
     
     def _build_context(self, documents: List[Dict[str, Any]]) -> str:
         """Build context string from documents"""
         context_parts = []
         for i, doc in enumerate(documents, 1):
-            context_parts.append(f"Document {i}: {doc['content']}")
+            metadata = doc.get('metadata') or {}
+            citation = self._format_citation(metadata)
+            also_in = self._duplicate_citations(metadata)
+            if also_in:
+                citation = f"{citation}; also in {'; '.join(also_in)}"
+            header = f"Document {i} ({citation})" if citation else f"Document {i}"
+            context_parts.append(f"{header}: {doc['content']}")
         return "\n\n".join(context_parts)
     
+    def _format_citation(self, metadata: Dict[str, Any]) -> str:
+        """Format the file and page range a chunk comes from"""
+        filename = metadata.get('filename')
+        page = metadata.get('page')
+        if not filename or page is None:
+            return filename or ""
+        page_end = metadata.get('page_end', page)
+        pages = f"p. {page}" if page_end == page else f"pp. {page}-{page_end}"
+        return f"{filename}, {pages}"
+    
+    def _duplicate_citations(self, metadata: Dict[str, Any]) -> List[str]:
+        """Citations of the other sources holding the same content (dropped as duplicates at ingestion)"""
+        duplicate_sources = metadata.get('duplicate_sources')
+        if not duplicate_sources:
+            return []
+        if isinstance(duplicate_sources, str):
+            duplicate_sources = json.loads(duplicate_sources)
+        return [self._format_citation(source) for source in duplicate_sources]
+    
     def _create_prompt_basic(self, query: str, context: str) -> str:
         """Create prompt for LLM"""
         prompt_template = self.get_prompt("BASIC").format(context=context)
         return f"".join({prompt_template})
 
-    def _create_prompt_improved(self, query: str, context: str) -> str:
-        """Create prompt for LLM"""
-        prompt_template = self.get_prompt("IMPROVED").format(context=context)
-        return f"""{prompt_template}
+    def _create_system_prompt(self) -> str:
+        """Create the fixed system prefix, without any per-request content"""
+        return self.get_prompt("IMPROVED").format()
 
-Context:
+    def _create_prompt_improved(self, query: str, context: str) -> str:
+        """Create the variable tail of the prompt: context and question, once each"""
+        return f"""Context:
 {context}
 
 Question: {query}
 
 Answer:"""
+
+    def _extract_usage(self, response, prompt: str) -> Dict[str, Any]:
+        """Token usage for the request, as reported by the provider when available"""
+        usage = getattr(response, "usage", None)
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = getattr(details, "cached_tokens", None)
+        completion_tokens = getattr(usage, "completion_tokens", None)
+        estimated = not isinstance(prompt_tokens, int)
+        if estimated:
+            prompt_tokens = self.system_prompt_tokens + count_tokens(prompt, self.model)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "system_prompt_tokens": self.system_prompt_tokens,
+            "cached_tokens": cached_tokens if isinstance(cached_tokens, int) else 0,
+            "completion_tokens": completion_tokens if isinstance(completion_tokens, int) else None,
+            "estimated": estimated
+        }
     
     def _format_sources(self, documents: List[Dict[str, Any]]) -> List[Dict]:
         """Format document sources for response"""
         return [
             {
                 "content": doc['content'][:200],
-                "metadata": doc.get('metadata', {})
+                "metadata": doc.get('metadata', {}),
+                "citation": self._format_citation(doc.get('metadata') or {}),
+                "also_in": self._duplicate_citations(doc.get('metadata') or {})
             }
             for doc in documents
         ]
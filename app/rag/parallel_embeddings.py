@@ -0,0 +1,206 @@
+"""
+Parallel Embedding Module
+Shards embedding batches across worker processes for large re-index jobs
+"""
+
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional
+
+import numpy as np
+from loguru import logger
+
+
+BACKEND_SENTENCE_TRANSFORMERS = "sentence-transformers"
+BACKEND_HUGGING_FACE = "huggingface"
+
+# Embedding service owned by each worker process, loaded on its first task
+_worker_service = None
+_worker_model = None
+
+
+def _load_service(backend: str, model_name: str):
+    """Load the embedding service for a backend inside the current process"""
+    if backend == BACKEND_HUGGING_FACE:
+        from app.rag.embeddings_hugging_face import EmbeddingHuggingFaceService
+        return EmbeddingHuggingFaceService(model_name)
+    from app.rag.embeddings import EmbeddingService
+    return EmbeddingService(model_name)
+
+
+def _worker_environment(num_threads: int) -> Dict[str, str]:
+    """Thread settings read by the OpenMP/MKL runtimes and tokenizers when they load"""
+    return {
+        "OMP_NUM_THREADS": str(num_threads),
+        "MKL_NUM_THREADS": str(num_threads),
+        "TOKENIZERS_PARALLELISM": "false",
+    }
+
+
+def _init_worker(backend: str, model_name: str, num_threads: int):
+    """Pool initializer: cap the torch thread count and record the model to load"""
+    global _worker_model
+    # Unpickling this initializer imports the app package, and torch with it,
+    # so the thread environment must already be inherited from the parent;
+    # set_num_threads still caps the intra-op pool at runtime
+    import torch
+    torch.set_num_threads(num_threads)
+    _worker_model = (backend, model_name)
+
+
+def _get_worker_service():
+    """
+    Embedding service of this worker, loaded on first use
+
+    Loading in a task rather than in the initializer means a failure (bad
+    model name, missing weights, OOM) is raised to the caller instead of
+    making the pool respawn the worker.
+    """
+    global _worker_service
+    if _worker_service is None:
+        _worker_service = _load_service(*_worker_model)
+    return _worker_service
+
+
+def _worker_dimension() -> int:
+    return int(_get_worker_service().embedding_dim)
+
+
+def _embed_shard(shm_name: str, shape: tuple, start: int, texts: List[str]) -> int:
+    """Embed a shard of texts and write the rows straight into shared memory"""
+    service = _get_worker_service()
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        output = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+        output[start:start + len(texts)] = service.embed_batch(texts)
+        del output
+    finally:
+        shm.close()
+    return len(texts)
+
+
+def backend_for(embedding_service) -> str:
+    """Backend name matching an in-process embedding service instance"""
+    if type(embedding_service).__name__ == "EmbeddingHuggingFaceService":
+        return BACKEND_HUGGING_FACE
+    return BACKEND_SENTENCE_TRANSFORMERS
+
+
+class ParallelEmbeddingExecutor:
+    """
+    Embeds large batches with a pool of worker processes
+
+    Each worker holds its own copy of the model with a fixed torch thread
+    count. Batches are split into shards, workers write their rows into a
+    shared memory block, and only row counts travel back through the pool.
+    Exposes the same embed_text / embed_batch interface as the in-process
+    embedding services.
+    """
+
+    def __init__(self, model_name: str, backend: str = BACKEND_SENTENCE_TRANSFORMERS,
+                 num_workers: Optional[int] = None, threads_per_worker: Optional[int] = None,
+                 shard_size: int = 64, startup_timeout: float = 300.0):
+        """
+        Initialize the worker pool
+
+        Args:
+            model_name: Model loaded by every worker
+            backend: sentence-transformers or huggingface
+            num_workers: Worker processes, defaults to half the cores
+            threads_per_worker: Torch threads per worker, defaults to cores / workers
+            shard_size: Texts embedded per worker task
+            startup_timeout: Seconds allowed for a worker to load the model
+
+        Raises:
+            RuntimeError: A worker could not start or load the model in time
+        """
+        cpu_count = os.cpu_count() or 1
+        self.num_workers = num_workers or max(1, cpu_count // 2)
+        self.threads_per_worker = threads_per_worker or max(1, cpu_count // self.num_workers)
+        self.shard_size = max(1, shard_size)
+        self.model_name = model_name
+        logger.info(
+            "Starting {} embedding workers ({} threads each) with model: {}",
+            self.num_workers, self.threads_per_worker, model_name
+        )
+        # Spawned workers copy the parent environment when they start, which
+        # happens on demand: keep the thread settings until close()
+        self._saved_environment = {key: os.environ.get(key) for key in _worker_environment(1)}
+        os.environ.update(_worker_environment(self.threads_per_worker))
+        # spawn: forking a process that already initialised torch is unsafe
+        # ProcessPoolExecutor raises BrokenProcessPool when a worker dies instead of respawning it
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.num_workers,
+            mp_context=mp.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(backend, model_name, self.threads_per_worker),
+        )
+        try:
+            self.embedding_dim = self._executor.submit(_worker_dimension).result(timeout=startup_timeout)
+        except FutureTimeoutError:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._restore_environment()
+            raise RuntimeError(
+                f"Embedding workers did not load model '{model_name}' within {startup_timeout:.0f}s"
+            ) from None
+        except Exception as e:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._restore_environment()
+            raise RuntimeError(f"Embedding workers failed to load model '{model_name}': {e}") from e
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        """
+        Generate embeddings for a batch of texts across the worker pool
+
+        Args:
+            texts: List of text strings
+
+        Returns:
+            Array of embeddings (float32)
+        """
+        if not texts:
+            return np.zeros((0, self.embedding_dim), dtype=np.float32)
+        shape = (len(texts), self.embedding_dim)
+        shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * 4)
+        pending = []
+        try:
+            pending = [
+                self._executor.submit(_embed_shard, shm.name, shape, start, texts[start:start + self.shard_size])
+                for start in range(0, len(texts), self.shard_size)
+            ]
+            for future in pending:
+                future.result()
+            return np.ndarray(shape, dtype=np.float32, buffer=shm.buf).copy()
+        except Exception as e:
+            for future in pending:
+                future.cancel()
+            logger.error("Error generating parallel batch embeddings: {}", e)
+            raise
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def embed_text(self, text: str) -> np.ndarray:
+        """Generate embedding for a single text"""
+        return self.embed_batch([text])[0]
+
+    def close(self):
+        """Stop the worker processes"""
+        self._executor.shutdown(wait=True)
+        self._restore_environment()
+
+    def _restore_environment(self):
+        for key, value in self._saved_environment.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,163 @@
+"""
+Partitioning Module
+Tags indexed chunks with partition metadata (category, language, page) and
+builds the metadata filters that DocumentRetriever pushes down to the index
+"""
+
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, Optional
+
+from loguru import logger
+
+
+# Keywords that identify each policy document / partition. Matched against the
+# accent-stripped, lower-cased filename at ingestion and against the query at
+# routing time.
+CATEGORY_KEYWORDS: Dict[str, tuple] = {
+    "devoluciones": (
+        "devolucion", "devoluciones", "devolver", "reembolso", "reembolsos",
+        "return", "returns", "refund", "refunds",
+    ),
+    "garantia": (
+        "garantia", "garantias", "defecto", "defectuoso", "reparacion",
+        "warranty", "defect", "defective", "repair",
+    ),
+}
+
+DEFAULT_CATEGORY = "general"
+
+# Small stopword lists are enough to tell apart the languages we index
+LANGUAGE_STOPWORDS: Dict[str, frozenset] = {
+    "es": frozenset({"el", "la", "los", "las", "de", "del", "que", "y", "en", "por", "para", "con", "una", "es"}),
+    "en": frozenset({"the", "of", "and", "to", "in", "for", "with", "is", "that", "on", "are", "be", "this"}),
+}
+
+DEFAULT_LANGUAGE = "es"
+
+# Metadata keys that can be used as retrieval filters
+FILTERABLE_FIELDS = ("category", "language", "filename", "page")
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize_text(text: str) -> str:
+    """Lower-case text and strip accents so keyword matching is robust"""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def _tokens(text: str) -> list:
+    return _WORD_RE.findall(normalize_text(text))
+
+
+def infer_category(filename: str) -> str:
+    """
+    Infer the document category from its filename
+
+    Args:
+        filename: PDF file name (e.g. Politica_Garantia_EcoMarket.pdf)
+
+    Returns:
+        Category name, or DEFAULT_CATEGORY when no keyword matches
+    """
+    normalized = normalize_text(filename)
+    for category, keywords in CATEGORY_KEYWORDS.items():
+        if any(keyword in normalized for keyword in keywords):
+            return category
+    return DEFAULT_CATEGORY
+
+
+def detect_language(text: str) -> str:
+    """
+    Detect the language of a chunk using stopword frequency
+
+    Args:
+        text: Chunk text
+
+    Returns:
+        ISO language code, DEFAULT_LANGUAGE when undecided
+    """
+    tokens = _tokens(text)
+    if not tokens:
+        return DEFAULT_LANGUAGE
+    scores = {
+        language: sum(1 for token in tokens if token in stopwords)
+        for language, stopwords in LANGUAGE_STOPWORDS.items()
+    }
+    best = max(scores, key=scores.get)
+    return best if scores[best] > 0 else DEFAULT_LANGUAGE
+
+
+def build_where_filter(filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Translate retrieval filters into a ChromaDB `where` clause
+
+    Scalar values become equality matches, lists become `$in` matches and
+    several fields are combined with `$and`.
+
+    Args:
+        filters: Mapping of metadata field to value or list of values
+
+    Returns:
+        ChromaDB where clause, or None when there is nothing to filter on
+    """
+    if not filters:
+        return None
+    clauses = []
+    for field, value in filters.items():
+        if value is None:
+            continue
+        if field not in FILTERABLE_FIELDS:
+            raise ValueError(f"Unsupported filter field: {field}")
+        if isinstance(value, (list, tuple, set)):
+            values = list(value)
+            if not values:
+                continue
+            clauses.append({field: {"$in": values}} if len(values) > 1 else {field: values[0]})
+        else:
+            clauses.append({field: value})
+    if not clauses:
+        return None
+    if len(clauses) == 1:
+        return clauses[0]
+    return {"$and": clauses}
+
+
+class QueryRouter:
+    """
+    Cheap keyword router that picks the partition a query targets
+    """
+
+    def __init__(self, category_keywords: Optional[Dict[str, Iterable[str]]] = None):
+        """
+        Initialize the query router
+
+        Args:
+            category_keywords: Mapping of category to routing keywords
+        """
+        self.category_keywords = {
+            category: frozenset(normalize_text(keyword) for keyword in keywords)
+            for category, keywords in (category_keywords or CATEGORY_KEYWORDS).items()
+        }
+
+    def route(self, query: str) -> Optional[Dict[str, Any]]:
+        """
+        Route a query to a single partition
+
+        Args:
+            query: User query
+
+        Returns:
+            Filters selecting the partition, or None when the query is ambiguous
+        """
+        tokens = set(_tokens(query))
+        scores = {
+            category: len(tokens & keywords)
+            for category, keywords in self.category_keywords.items()
+        }
+        matched = [category for category, score in scores.items() if score > 0]
+        if len(matched) != 1:
+            return None
+        logger.debug("Query routed to partition: {}", matched[0])
+        return {"category": matched[0]}
@@ -0,0 +1,330 @@
+"""
+Resilience Module
+Retries with jittered backoff, hedged requests and a circuit breaker for upstream calls
+"""
+
+import asyncio
+import random
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from loguru import logger
+
+from app.rag.admission import Deadline, DeadlineExceededError
+
+
+RETRYABLE_STATUS_CODES = frozenset({408, 409, 429, 500, 502, 503, 504})
+
+# Exception class names raised by the OpenAI SDK for transport level failures
+RETRYABLE_ERROR_NAMES = frozenset({"APITimeoutError", "APIConnectionError", "RateLimitError", "InternalServerError"})
+
+
+class CircuitOpenError(Exception):
+    """Raised when the circuit breaker rejects a call without trying upstream"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Whether a failed upstream call is worth retrying"""
+    if isinstance(exc, (DeadlineExceededError, CircuitOpenError)):
+        return False
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    status_code = getattr(exc, "status_code", None)
+    if isinstance(status_code, int):
+        return status_code in RETRYABLE_STATUS_CODES
+    return type(exc).__name__ in RETRYABLE_ERROR_NAMES
+
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+    """Delay requested by the upstream through retry-after-ms / Retry-After headers"""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return max(0.0, float(retry_after_ms) / 1000)
+        except ValueError:
+            pass
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """
+    Bounded retries with per-attempt timeouts and full-jitter exponential backoff
+    """
+
+    def __init__(self, max_attempts: int = 3, attempt_timeout: Optional[float] = 20.0,
+                 base_delay: float = 0.25, max_delay: float = 8.0):
+        """
+        Initialize the retry policy
+
+        Args:
+            max_attempts: Total attempts including the first one
+            attempt_timeout: Seconds allowed per attempt, None for no limit
+            base_delay: Backoff for the first retry
+            max_delay: Upper bound for a single backoff
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.attempt_timeout = attempt_timeout
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Delay before the next attempt
+
+        Args:
+            attempt: Number of attempts already made (1 after the first failure)
+            retry_after: Delay requested by the upstream, honoured as a minimum
+
+        Returns:
+            Seconds to wait
+        """
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+
+class LatencyTracker:
+    """Sliding window of successful call latencies"""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, quantile: float) -> Optional[float]:
+        """Latency at the given quantile (0-1), None without samples"""
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(quantile * len(ordered)))]
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker
+
+    After failure_threshold consecutive retryable failures the circuit opens
+    and calls fail fast for reset_timeout seconds; then a single trial call is
+    let through (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        Initialize the circuit breaker
+
+        Args:
+            failure_threshold: Consecutive failures that open the circuit
+            reset_timeout: Seconds the circuit stays open
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+
+    def before_call(self):
+        """Raise CircuitOpenError when calls must not reach the upstream"""
+        if self.state == self.OPEN:
+            elapsed = time.monotonic() - self.opened_at
+            if elapsed < self.reset_timeout:
+                raise CircuitOpenError("LLM circuit open", retry_after=self.reset_timeout - elapsed)
+            self.state = self.HALF_OPEN
+            self._trial_in_flight = False
+        if self.state == self.HALF_OPEN:
+            if self._trial_in_flight:
+                raise CircuitOpenError("LLM circuit half-open, trial call in flight", retry_after=1.0)
+            self._trial_in_flight = True
+
+    def record_cancelled(self):
+        """A call ended without an upstream answer (losing hedge, local error)"""
+        self._trial_in_flight = False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning("Circuit opened after {} consecutive failures", self.failures)
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+        self._trial_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self.failures}
+
+
+class ResilientCaller:
+    """
+    Runs an upstream call with retries, optional hedging and a circuit breaker
+    """
+
+    def __init__(self, retry_policy: Optional[RetryPolicy] = None,
+                 circuit_breaker: Optional[CircuitBreaker] = None,
+                 hedge_quantile: Optional[float] = None, hedge_min_samples: int = 20):
+        """
+        Initialize the caller
+
+        Args:
+            retry_policy: Retry and timeout policy
+            circuit_breaker: Breaker shared by all calls to the same upstream
+            hedge_quantile: Latency quantile (e.g. 0.95) after which a second,
+                hedged request is sent; None disables hedging
+            hedge_min_samples: Latency samples required before hedging starts
+        """
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.circuit_breaker = circuit_breaker
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.latencies = LatencyTracker()
+        self.hedges = 0
+        self.retries = 0
+
+    def hedge_delay(self) -> Optional[float]:
+        """Delay before hedging, derived from observed latency"""
+        if self.hedge_quantile is None or len(self.latencies) < self.hedge_min_samples:
+            return None
+        return self.latencies.percentile(self.hedge_quantile)
+
+    def _attempt_timeout(self, deadline: Optional[Deadline]) -> Optional[float]:
+        timeout = self.retry_policy.attempt_timeout
+        remaining = deadline.remaining() if deadline else None
+        if remaining is not None:
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        return timeout
+
+    async def _timed(self, fn: Callable[[Optional[float]], Awaitable[Any]], timeout: Optional[float]) -> Any:
+        if self.circuit_breaker:
+            self.circuit_breaker.before_call()
+        started = time.monotonic()
+        try:
+            result = await asyncio.wait_for(fn(timeout), timeout)
+        except asyncio.CancelledError:
+            if self.circuit_breaker:
+                self.circuit_breaker.record_cancelled()
+            raise
+        except Exception as e:
+            if self.circuit_breaker and is_retryable(e):
+                self.circuit_breaker.record_failure()
+            elif self.circuit_breaker and isinstance(getattr(e, "status_code", None), int):
+                # The upstream answered: request-level errors say nothing about its health
+                self.circuit_breaker.record_success()
+            elif self.circuit_breaker:
+                # Local errors (deadline, waiting for a slot, bugs) never got an upstream answer
+                self.circuit_breaker.record_cancelled()
+            raise
+        self.latencies.record(time.monotonic() - started)
+        if self.circuit_breaker:
+            self.circuit_breaker.record_success()
+        return result
+
+    async def _attempt(self, fn: Callable[[Optional[float]], Awaitable[Any]], timeout: Optional[float]) -> Any:
+        """One logical attempt, hedged with a second request when it runs slow"""
+        delay = self.hedge_delay()
+        primary = asyncio.ensure_future(self._timed(fn, timeout))
+        if delay is None or (timeout is not None and delay >= timeout):
+            return await primary
+
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                self.hedges += 1
+                logger.debug("Hedging slow upstream call after {:.3f}s", delay)
+                hedged_timeout = None if timeout is None else max(0.0, timeout - delay)
+                tasks.add(asyncio.ensure_future(self._timed(fn, hedged_timeout)))
+            last_error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    last_error = task.exception()
+            raise last_error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def call(self, fn: Callable[[Optional[float]], Awaitable[Any]],
+                   deadline: Optional[Deadline] = None) -> Any:
+        """
+        Call fn until it succeeds, retries are exhausted or the deadline passes
+
+        Args:
+            fn: Coroutine function receiving the per-attempt timeout in seconds
+            deadline: Request deadline bounding all attempts and backoffs
+
+        Returns:
+            Result of the first successful attempt
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            if deadline:
+                deadline.check("upstream call")
+            try:
+                return await self._attempt(fn, self._attempt_timeout(deadline))
+            except Exception as e:
+                if not is_retryable(e) or attempt >= self.retry_policy.max_attempts:
+                    self._raise_final(e, attempt)
+                delay = self.retry_policy.backoff(attempt, retry_after_seconds(e))
+                remaining = deadline.remaining() if deadline else None
+                if remaining is not None and delay >= remaining:
+                    self._raise_final(e, attempt)
+                self.retries += 1
+                logger.warning(
+                    "Upstream call failed ({}), retry {}/{} in {:.2f}s",
+                    type(e).__name__, attempt, self.retry_policy.max_attempts - 1, delay
+                )
+                await asyncio.sleep(delay)
+
+    @staticmethod
+    def _raise_final(exc: Exception, attempts: int):
+        """Re-raise the error that ends the call; timeouts become DeadlineExceededError"""
+        if isinstance(exc, (asyncio.TimeoutError, TimeoutError)):
+            raise DeadlineExceededError(
+                f"upstream call timed out after {attempts} attempt{'s' if attempts > 1 else ''}"
+            ) from exc
+        raise exc
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters exposed for health/diagnostics"""
+        return {
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "p95_latency": self.latencies.percentile(0.95),
+            "circuit": self.circuit_breaker.stats() if self.circuit_breaker else None,
+        }
@@ -4,11 +4,23 @@ Retrieves relevant documents using vector similarity search
 """
 
 import chromadb
-from typing import List, Dict, Any
+import hashlib
+import json
+from contextlib import nullcontext
+from typing import List, Dict, Any, Optional
 from loguru import logger
 from app.rag.embeddings import EmbeddingService
 from app.rag.embeddings_hugging_face import EmbeddingHuggingFaceService
+from app.rag.admission import Deadline, StageLimiter
+from app.rag.cache import LRUCache
+from app.rag.chunking import StreamingChunker, iter_pdf_pages
+from app.rag.coalescing import make_query_key, normalize_query
+from app.rag.dedup import ChunkDeduplicator
+from app.rag.partitioning import QueryRouter, build_where_filter, detect_language, infer_category
+from app.rag.snapshot import load_snapshot, snapshot_exists, write_snapshot
 from app.config.settings import get_settings
+from utils.logging_config import hot_logger
+from utils.memory import AllocationProfiler
 
 
 
@@ -17,7 +29,12 @@ class DocumentRetriever:
     Retrieves relevant documents using ChromaDB vector store
     """
     def __init__(self, embedding_service: EmbeddingHuggingFaceService, 
-                 collection_name: str = "ecomarketdocs"):
+                 collection_name: str = "ecomarketdocs",
+                 stage_limiter: Optional[StageLimiter] = None,
+                 ingestion_embedder=None,
+                 snapshot_path: Optional[str] = None,
+                 use_snapshot: bool = True,
+                 index_on_init: bool = True):
         """
         Initialize the document retriever and populate collection with PDF contents
         Si prefiere usar la biblioteca Hugging Face Transformers, puede manejar manualmente 
@@ -26,60 +43,132 @@ class DocumentRetriever:
         Args:
             embedding_service: Service for generating embeddings
             collection_name: Name of the ChromaDB collection
+            stage_limiter: Concurrency limits for the embedding and search stages
+            ingestion_embedder: Embedder used to index documents (e.g. a
+                ParallelEmbeddingExecutor); defaults to embedding_service
+            snapshot_path: Prebuilt index snapshot to serve instead of indexing
+                at startup; defaults to settings.index_snapshot_path
+            use_snapshot: Set to False to always start from an empty collection
+            index_on_init: Index the local and blob PDFs when no snapshot is loaded
         """
         import os
         from glob import glob
         try:
             logger.info(f"Initializing document retriever with collection: {collection_name}")
             self.embedding_service = embedding_service
+            self.stage_limiter = stage_limiter or StageLimiter()
+            self.ingestion_embedder = ingestion_embedder or embedding_service
             settings = get_settings()
-            self.client = chromadb.Client()
-            self.collection = self.client.get_or_create_collection(collection_name)
-            self.load_and_index_pdfs()
-            self.load_and_index_pdfs_from_blob(
-                connection_string=settings.blob_storage_connection_string,
-                container_name=settings.blob_container_name
+            self.ingestion_batch_size = settings.ingestion_batch_size
+            self._pending_chunks = []
+            self.chunker = StreamingChunker(
+                chunk_size=settings.chunk_size,
+                chunk_overlap=settings.chunk_overlap
             )
+            self.router = QueryRouter() if settings.enable_query_router else None
+            self.deduplicator = (
+                ChunkDeduplicator(
+                    threshold=settings.dedup_similarity_threshold,
+                    near_duplicates=settings.dedup_near_duplicates
+                )
+                if settings.enable_chunk_dedup else None
+            )
+            # Metadata of kept chunks, updated with the sources of their duplicates
+            self._chunk_metadata = {}
+            self._stale_metadata = set()
+            self.embedding_cache = LRUCache(settings.embedding_cache_size)
+            self.retrieval_cache = LRUCache(settings.retrieval_cache_size)
+            self.ingestion_profile = None
+            profiler = (
+                AllocationProfiler("ingestion", top_n=settings.profile_top_n)
+                if settings.profile_ingestion else None
+            )
+            snapshot_path = (snapshot_path or settings.index_snapshot_path) if use_snapshot else None
+            with profiler or nullcontext():
+                if snapshot_exists(snapshot_path):
+                    # Serve the prebuilt index; refuses snapshots from another embedding model
+                    self.client = None
+                    self.collection = load_snapshot(
+                        snapshot_path,
+                        expected_model=self._model_name(),
+                        expected_chunk_size=settings.chunk_size,
+                        expected_chunk_overlap=settings.chunk_overlap
+                    )
+                else:
+                    if snapshot_path:
+                        logger.warning(f"No index snapshot at {snapshot_path}, indexing documents at startup")
+                    self.client = chromadb.Client()
+                    self.collection = self.client.get_or_create_collection(collection_name)
+                    if index_on_init:
+                        self.build_index()
+            if profiler is not None:
+                self.ingestion_profile = profiler.report
             logger.info("DocumentRetriever initialized successfully")
 
         except Exception as e:
             logger.error(f"Error initializing DocumentRetriever: {str(e)}")
             raise
    
+    def _model_name(self) -> Optional[str]:
+        """Embedding model the index vectors must come from"""
+        return getattr(self.embedding_service, "model_name", None)
+
+    def build_index(self, docs_folder: str = None, include_blob: bool = True):
+        """
+        Index the local PDF folder and, optionally, the Azure Blob Storage container.
+        """
+        settings = get_settings()
+        self.load_and_index_pdfs(docs_folder)
+        if include_blob:
+            self.load_and_index_pdfs_from_blob(
+                connection_string=settings.blob_storage_connection_string,
+                container_name=settings.blob_container_name
+            )
+        self._release_ingestion_state()
+
+    def _release_ingestion_state(self):
+        """
+        Drop the dedup state once the index is built; it is only needed to
+        compare chunks during ingestion and would otherwise live as long as
+        the service. Documents indexed later are not deduplicated against
+        the ones indexed before.
+        """
+        self._flush_chunks()
+        if self.deduplicator is not None:
+            self.deduplicator.clear()
+        self._chunk_metadata = {}
+
+    def export_snapshot(self, path: str) -> Dict[str, Any]:
+        """
+        Write the current collection as a portable index snapshot.
+        """
+        settings = get_settings()
+        contents = self.collection.get(include=["embeddings", "documents", "metadatas"])
+        return write_snapshot(
+            path,
+            ids=contents["ids"],
+            embeddings=contents["embeddings"],
+            documents=contents["documents"],
+            metadatas=contents["metadatas"],
+            model_name=self._model_name(),
+            chunk_size=settings.chunk_size,
+            chunk_overlap=settings.chunk_overlap
+        )
+
     def load_and_index_pdfs(self, docs_folder: str = None):
         """
         Load and register PDF documents from docs_folder, splitting into chunks and indexing.
         """
         import os
         from glob import glob
-        from pypdf import PdfReader
-        from langchain.text_splitter import RecursiveCharacterTextSplitter
         try:
             pdf_folder = docs_folder or os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "docs")
             pdf_files = glob(os.path.join(pdf_folder, "*.pdf"))
             logger.info(f"Found {len(pdf_files)} PDF files in {pdf_folder}")
             for pdf_path in pdf_files:
-                try:
-                    reader = PdfReader(pdf_path)
-                    text = "\n".join(page.extract_text() or "" for page in reader.pages)
-                    text_temp = text.replace("\n", " ").replace("\r", " ")
-                    if text_temp.strip():
-                        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-                        docs = text_splitter.create_documents([text])
-                        for idx, doc in enumerate(docs):
-                            chunk_text = doc.page_content if hasattr(doc, 'page_content') else str(doc)
-                            embedding = self.embedding_service.embed_text(chunk_text)
-                            self.collection.add(
-                                documents=[chunk_text],
-                                embeddings=[embedding.tolist()],
-                                metadatas=[{"filename": os.path.basename(pdf_path), "chunk": idx}],
-                                ids=[f"{os.path.splitext(os.path.basename(pdf_path))[0]}_chunk{idx}"]
-                            )
-                        logger.info(f"Indexed PDF in {len(docs)} chunks: {pdf_path}")
-                    else:
-                        logger.warning(f"No text extracted from: {pdf_path}")
-                except Exception as pdf_err:
-                    logger.error(f"Error processing PDF {pdf_path}: {pdf_err}")
+                self._index_pdf(pdf_path, source="local", origin=os.path.relpath(pdf_path, pdf_folder))
+            self._flush_chunks()
+            self._log_dedup_stats()
         except Exception as e:
             logger.error(f"Error loading and indexing PDFs: {str(e)}")
             raise
@@ -90,8 +179,6 @@ class DocumentRetriever:
         """
         from azure.storage.blob import BlobServiceClient
         from tempfile import TemporaryDirectory
-        from pypdf import PdfReader
-        from langchain.text_splitter import RecursiveCharacterTextSplitter
         import os
         try:
             blob_service_client = BlobServiceClient.from_connection_string(connection_string)
@@ -101,60 +188,181 @@ class DocumentRetriever:
                 pdf_files = []
                 for blob in blobs:
                     if blob.name.lower().endswith('.pdf'):
-                        file_path = os.path.join(temp_dir, os.path.basename(blob.name))
+                        # Blobs in different folders may share a basename
+                        file_path = os.path.join(temp_dir, f"{len(pdf_files)}_{os.path.basename(blob.name)}")
                         with open(file_path, "wb") as f:
                             f.write(container_client.download_blob(blob.name).readall())
-                        pdf_files.append(file_path)
+                        pdf_files.append((file_path, blob.name))
                 logger.info(f"Downloaded {len(pdf_files)} PDF files from Azure Blob Storage")
-                for pdf_path in pdf_files:
-                    try:
-                        reader = PdfReader(pdf_path)
-                        text = "\n".join(page.extract_text() or "" for page in reader.pages)
-                        text_temp = text.replace("\n", " ").replace("\r", " ")
-                        if text_temp.strip():
-                            text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-                            docs = text_splitter.create_documents([text])
-                            for idx, doc in enumerate(docs):
-                                chunk_text = doc.page_content if hasattr(doc, 'page_content') else str(doc)
-                                embedding = self.embedding_service.embed_text(chunk_text)
-                                self.collection.add(
-                                    documents=[chunk_text],
-                                    embeddings=[embedding.tolist()],
-                                    metadatas=[{"filename": os.path.basename(pdf_path), "chunk": idx}],
-                                    ids=[f"{os.path.splitext(os.path.basename(pdf_path))[0]}_chunk{idx}"]
-                                )
-                            logger.info(f"Indexed PDF in {len(docs)} chunks: {pdf_path}")
-                        else:
-                            logger.warning(f"No text extracted from: {pdf_path}")
-                    except Exception as pdf_err:
-                        logger.error(f"Error processing PDF {pdf_path}: {pdf_err}")
+                for pdf_path, blob_name in pdf_files:
+                    self._index_pdf(pdf_path, source="blob", origin=blob_name)
+                self._flush_chunks()
+                self._log_dedup_stats()
         except Exception as e:
             logger.error(f"Error loading and indexing PDFs from blob: {str(e)}")
             raise
 
-    async def retrieve(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
+    def _index_pdf(self, pdf_path: str, source: str, origin: Optional[str] = None):
+        """
+        Stream a PDF page by page into chunks and index them tagged with
+        partition metadata (category, language) and provenance (pages and
+        character offsets) so retrieval can be filtered and answers cite pages.
+        Chunks repeating content already indexed in the same partition are
+        dropped and recorded as additional sources of the kept chunk. A PDF that cannot be read is
+        skipped; embedding or indexing errors are raised with the buffered
+        chunks kept.
+
+        Args:
+            pdf_path: Local path of the PDF
+            source: "local" or "blob"
+            origin: Name of the PDF within its source (relative path or blob
+                name); makes chunk ids unique across sources and folders
+        """
+        import os
+        filename = os.path.basename(origin or pdf_path)
+        category = infer_category(filename)
+        origin_hash = hashlib.sha1(f"{source}:{origin or filename}".encode("utf-8")).hexdigest()[:8]
+        id_prefix = f"{os.path.splitext(filename)[0]}_{origin_hash}"
+        chunk_count = 0
+        duplicate_count = 0
+        for chunk in self._iter_pdf_chunks(pdf_path):
+            chunk_id = f"{id_prefix}_chunk{chunk.index}"
+            language = detect_language(chunk.text)
+            if self.deduplicator is not None:
+                # Dedup within the partition: each partition keeps its own copy for filtered queries
+                original_id = self.deduplicator.check(chunk_id, chunk.text, partition=(category, language))
+                if original_id is not None:
+                    self._record_duplicate(original_id, {
+                        "filename": filename,
+                        "page": chunk.page_start,
+                        "page_end": chunk.page_end,
+                        "source": source,
+                    })
+                    duplicate_count += 1
+                    continue
+            metadata = {
+                "filename": filename,
+                "chunk": chunk.index,
+                "category": category,
+                "language": language,
+                "page": chunk.page_start,
+                "page_end": chunk.page_end,
+                "char_start": chunk.char_start,
+                "char_end": chunk.char_end,
+                "source": source,
+            }
+            if self.deduplicator is not None:
+                self._chunk_metadata[chunk_id] = metadata
+            self._pending_chunks.append((chunk_id, chunk.text, metadata))
+            chunk_count += 1
+            if len(self._pending_chunks) >= self.ingestion_batch_size:
+                self._flush_chunks()
+        if not chunk_count and not duplicate_count:
+            logger.warning(f"No text extracted from: {pdf_path}")
+            return
+        logger.info(
+            f"Indexed PDF in {chunk_count} chunks, {duplicate_count} duplicates dropped ({category}): {origin or pdf_path}"
+        )
+
+    def _iter_pdf_chunks(self, pdf_path: str):
+        """
+        Chunks of a PDF; a read error is logged and ends the document.
+        Errors raised while the caller handles a chunk (embedding, indexing)
+        are not caught here and reach the caller.
+        """
+        try:
+            yield from self.chunker.chunk_pages(iter_pdf_pages(pdf_path))
+        except Exception as pdf_err:
+            logger.error(f"Error processing PDF {pdf_path}: {pdf_err}")
+
+    def _record_duplicate(self, original_id: str, duplicate_source: Dict[str, Any]):
+        """Add the source of a dropped chunk to the chunk that was kept for it"""
+        metadata = self._chunk_metadata[original_id]
+        sources = json.loads(metadata.get("duplicate_sources", "[]"))
+        if duplicate_source not in sources:
+            sources.append(duplicate_source)
+            # Collection metadata only holds scalars: store the list as JSON
+            metadata["duplicate_sources"] = json.dumps(sources, ensure_ascii=False)
+            self._stale_metadata.add(original_id)
+
+    def _log_dedup_stats(self):
+        if self.deduplicator is not None:
+            stats = self.deduplicator.stats()
+            logger.info(
+                f"Chunk dedup: {stats['kept']} kept, {stats['exact_duplicates']} exact and "
+                f"{stats['near_duplicates']} near duplicates dropped"
+            )
+
+    def _flush_chunks(self):
+        """Embed pending chunks as one batch and add them to the collection"""
+        if self._pending_chunks:
+            ids, texts, metadatas = (list(values) for values in zip(*self._pending_chunks))
+            embeddings = self.ingestion_embedder.embed_batch(texts)
+            self.collection.add(
+                documents=texts,
+                embeddings=embeddings.tolist(),
+                metadatas=metadatas,
+                ids=ids
+            )
+            # Only drop the buffer once indexed: a failed batch is kept for the next flush
+            self._pending_chunks = []
+            # Chunks added now already carry their duplicate sources
+            self._stale_metadata.difference_update(ids)
+            # New chunks can change any cached result
+            self.retrieval_cache.clear()
+        if self._stale_metadata:
+            stale_ids = sorted(self._stale_metadata)
+            self._stale_metadata = set()
+            self.collection.update(
+                ids=stale_ids,
+                metadatas=[self._chunk_metadata[chunk_id] for chunk_id in stale_ids]
+            )
+
+    async def retrieve(self, query: str, top_k: int = 3,
+                       filters: Optional[Dict[str, Any]] = None,
+                       deadline: Optional[Deadline] = None) -> List[Dict[str, Any]]:
         """
         Retrieve relevant documents for a query
         
         Args:
             query: Search query
             top_k: Number of documents to retrieve
+            filters: Metadata filters (category, language, filename, page) pushed
+                down to the index. When omitted and the query router is enabled,
+                the router picks the partition.
+            deadline: Request deadline; raises DeadlineExceededError when exceeded
             
         Returns:
             List of relevant documents with metadata
         """
         try:
-            logger.info(f"Retrieving documents for query: {query[:50]}...")
+            hot_logger.debug("Retrieving documents for query: {:.50}...", query)
             
+            cache_key = make_query_key(query, top_k=top_k, filters=filters)
+            cached = self.retrieval_cache.get(cache_key)
+            if cached is not None:
+                hot_logger.info("Retrieved {} documents (cached)", len(cached))
+                return list(cached)
             
             # Generate query embedding
-            query_embedding = self.embedding_service.embed_text(query)
+            query_embedding = await self.embed_query(query, deadline=deadline)
             
-            # Search in vector store
-            results = self.collection.query(
-                query_embeddings=[query_embedding.tolist()],
-                n_results=top_k
+            routed = False
+            if filters is None and self.router is not None:
+                filters = self.router.route(query)
+                routed = filters is not None
+            where = build_where_filter(filters)
+
+            # Search in vector store, scanning only the selected partition
+            results = await self.stage_limiter.run(
+                "search", self._query_collection, query_embedding, top_k, where, deadline=deadline
             )
+            if routed and not (results['documents'] and results['documents'][0]):
+                # The router is a heuristic: fall back to the full collection
+                logger.info("Routed partition returned no documents, searching all partitions")
+                results = await self.stage_limiter.run(
+                    "search", self._query_collection, query_embedding, top_k, None, deadline=deadline
+                )
             
             documents = []
             if results['documents']:
@@ -165,9 +373,38 @@ class DocumentRetriever:
                         'distance': results['distances'][0][i] if results['distances'] else 0.0
                     })
             
-            logger.info(f"Retrieved {len(documents)} documents")
-            return documents
+            self.retrieval_cache.set(cache_key, documents)
+            hot_logger.info("Retrieved {} documents", len(documents))
+            return list(documents)
             
         except Exception as e:
-            logger.error(f"Error retrieving documents: {str(e)}")
+            logger.error("Error retrieving documents: {}", e)
             raise
+
+    async def embed_query(self, query: str, deadline: Optional[Deadline] = None):
+        """Embed a query, served from the embedding cache when possible"""
+        key = normalize_query(query)
+        embedding = self.embedding_cache.get(key)
+        if embedding is None:
+            embedding = await self.stage_limiter.run(
+                "embedding", self.embedding_service.embed_text, query, deadline=deadline
+            )
+            self.embedding_cache.set(key, embedding)
+        return embedding
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Embedding and retrieval cache counters"""
+        return {
+            "embedding": self.embedding_cache.stats(),
+            "retrieval": self.retrieval_cache.stats(),
+        }
+
+    def _query_collection(self, query_embedding, top_k: int, where: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Run the vector search, pushing the metadata filter down to the index"""
+        query_kwargs = {
+            "query_embeddings": [query_embedding.tolist()],
+            "n_results": top_k,
+        }
+        if where:
+            query_kwargs["where"] = where
+        return self.collection.query(**query_kwargs)
@@ -0,0 +1,266 @@
+"""
+Index Snapshot Module
+Portable, versioned index snapshots built offline and loaded at startup
+"""
+
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from loguru import logger
+
+
+SNAPSHOT_FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+VECTORS_FILE = "vectors.npy"
+NORMS_FILE = "norms.npy"
+CHUNKS_FILE = "chunks.jsonl"
+
+
+class SnapshotMismatchError(ValueError):
+    """Raised when a snapshot is incompatible with the running configuration"""
+
+
+def snapshot_exists(path: Optional[str]) -> bool:
+    """Whether path holds an index snapshot"""
+    return bool(path) and os.path.isfile(os.path.join(path, MANIFEST_FILE))
+
+
+def write_snapshot(path: str, ids: Sequence[str], embeddings, documents: Sequence[str],
+                   metadatas: Sequence[Dict[str, Any]], model_name: str,
+                   chunk_size: int, chunk_overlap: int) -> Dict[str, Any]:
+    """
+    Write an index snapshot directory
+
+    The snapshot holds a contiguous float32 vector matrix (vectors.npy), the
+    squared L2 norm of each vector (norms.npy), one JSON line per chunk with its id, text and metadata (chunks.jsonl) and a
+    manifest describing how it was built. It is written to a temporary
+    directory first and moved into place, so readers never see a partial one.
+
+    Args:
+        path: Output directory, replaced if it exists
+        ids: Chunk ids
+        embeddings: Chunk embeddings, one row per chunk
+        documents: Chunk texts
+        metadatas: Chunk metadata
+        model_name: Embedding model used to build the vectors
+        chunk_size: Chunking parameter used at ingestion
+        chunk_overlap: Chunking parameter used at ingestion
+
+    Returns:
+        The manifest
+    """
+    vectors = np.ascontiguousarray(np.asarray(embeddings, dtype=np.float32))
+    if vectors.ndim != 2 or not (len(ids) == len(documents) == len(metadatas) == vectors.shape[0]):
+        raise ValueError("Snapshot ids, documents, metadatas and embeddings must have the same length")
+
+    manifest = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "model_name": model_name,
+        "embedding_dim": int(vectors.shape[1]),
+        "count": int(vectors.shape[0]),
+        "dtype": "float32",
+        "distance": "l2",
+        "chunk_size": chunk_size,
+        "chunk_overlap": chunk_overlap,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=".snapshot-", dir=parent)
+    try:
+        np.save(os.path.join(staging, VECTORS_FILE), vectors)
+        np.save(os.path.join(staging, NORMS_FILE), np.einsum("ij,ij->i", vectors, vectors))
+        with open(os.path.join(staging, CHUNKS_FILE), "w", encoding="utf-8") as f:
+            for chunk_id, text, metadata in zip(ids, documents, metadatas):
+                f.write(json.dumps({"id": chunk_id, "text": text, "metadata": metadata}, ensure_ascii=False))
+                f.write("\n")
+        with open(os.path.join(staging, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(staging, path)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    logger.info("Wrote index snapshot with {} chunks to {}", manifest["count"], path)
+    return manifest
+
+
+def load_snapshot(path: str, expected_model: Optional[str] = None,
+                  expected_chunk_size: Optional[int] = None,
+                  expected_chunk_overlap: Optional[int] = None) -> "SnapshotCollection":
+    """
+    Load an index snapshot
+
+    Vectors and their norms are memory-mapped, not read: loading cost does
+    not depend on the index size and pages are shared between processes
+    serving the same file.
+
+    Args:
+        path: Snapshot directory
+        expected_model: Embedding model of the running service
+        expected_chunk_size: Chunking setting of the running service; a
+            snapshot chunked differently is served with a warning
+        expected_chunk_overlap: Chunking setting of the running service
+
+    Returns:
+        Read-only collection serving queries from the snapshot
+
+    Raises:
+        SnapshotMismatchError: Unsupported format or different embedding model
+    """
+    with open(os.path.join(path, MANIFEST_FILE), encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        raise SnapshotMismatchError(
+            f"Unsupported snapshot format {manifest.get('format_version')} (expected {SNAPSHOT_FORMAT_VERSION})"
+        )
+    if expected_model and manifest.get("model_name") != expected_model:
+        raise SnapshotMismatchError(
+            f"Snapshot built with embedding model '{manifest.get('model_name')}', "
+            f"but the service uses '{expected_model}'"
+        )
+    for setting, expected in (("chunk_size", expected_chunk_size), ("chunk_overlap", expected_chunk_overlap)):
+        if expected is not None and manifest.get(setting) != expected:
+            logger.warning(
+                "Snapshot at {} was built with {}={}, but the service uses {}; "
+                "rebuild it with python -m app.rag.build_index to apply the current chunking",
+                path, setting, manifest.get(setting), expected
+            )
+
+    vectors = np.load(os.path.join(path, VECTORS_FILE), mmap_mode="r")
+    norms_path = os.path.join(path, NORMS_FILE)
+    squared_norms = None
+    if os.path.isfile(norms_path):
+        squared_norms = np.load(norms_path, mmap_mode="r")
+    else:
+        logger.warning("Snapshot at {} has no {}, computing vector norms at load", path, NORMS_FILE)
+    ids, documents, metadatas = [], [], []
+    with open(os.path.join(path, CHUNKS_FILE), encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            ids.append(record["id"])
+            documents.append(record["text"])
+            metadatas.append(record["metadata"])
+    if vectors.shape[0] != len(ids) or vectors.shape[0] != manifest["count"]:
+        raise SnapshotMismatchError(f"Snapshot at {path} is inconsistent: {vectors.shape[0]} vectors, {len(ids)} chunks")
+    if squared_norms is not None and squared_norms.shape != (vectors.shape[0],):
+        raise SnapshotMismatchError(f"Snapshot at {path} is inconsistent: {squared_norms.shape[0]} norms, {len(ids)} chunks")
+    logger.info("Loaded index snapshot with {} chunks from {}", len(ids), path)
+    return SnapshotCollection(vectors, ids, documents, metadatas, manifest, squared_norms=squared_norms)
+
+
+def _matches(metadata: Dict[str, Any], where: Dict[str, Any]) -> bool:
+    """Evaluate the subset of ChromaDB where clauses built by build_where_filter"""
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(_matches(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(_matches(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for operator, operand in condition.items():
+                if operator == "$eq" and value != operand:
+                    return False
+                if operator == "$ne" and value == operand:
+                    return False
+                if operator == "$in" and value not in operand:
+                    return False
+                if operator == "$nin" and value in operand:
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+class SnapshotCollection:
+    """
+    Read-only collection served from a snapshot
+
+    Implements the parts of the ChromaDB collection API used by
+    DocumentRetriever (query, get, count) with an exact search over the
+    memory-mapped vectors, returning squared L2 distances like ChromaDB's
+    default space.
+    """
+
+    def __init__(self, vectors: np.ndarray, ids: List[str], documents: List[str],
+                 metadatas: List[Dict[str, Any]], manifest: Dict[str, Any],
+                 squared_norms: Optional[np.ndarray] = None):
+        self.vectors = vectors
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        self.manifest = manifest
+        self.name = f"snapshot:{manifest.get('model_name')}"
+        # Precomputed at build time; computing them here reads every vector page
+        self._squared_norms = (
+            squared_norms if squared_norms is not None else np.einsum("ij,ij->i", vectors, vectors)
+        )
+        self._masks: Dict[str, np.ndarray] = {}
+
+    def count(self) -> int:
+        return len(self.ids)
+
+    def _mask(self, where: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        if not where:
+            return None
+        key = json.dumps(where, sort_keys=True, default=str)
+        mask = self._masks.get(key)
+        if mask is None:
+            # Partitions are few and static: evaluate each filter once
+            mask = np.fromiter((_matches(metadata, where) for metadata in self.metadatas), dtype=bool, count=len(self.metadatas))
+            self._masks[key] = mask
+        return mask
+
+    def query(self, query_embeddings, n_results: int = 10, where: Optional[Dict[str, Any]] = None,
+              **kwargs) -> Dict[str, List[List[Any]]]:
+        """Nearest neighbours of each query embedding, optionally filtered by metadata"""
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(-1, self.vectors.shape[1])
+        mask = self._mask(where)
+        candidates = np.flatnonzero(mask) if mask is not None else None
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for query in queries:
+            if candidates is not None:
+                distances = self._squared_norms[candidates] - 2.0 * (self.vectors[candidates] @ query) + query @ query
+                rows = candidates
+            else:
+                distances = self._squared_norms - 2.0 * (self.vectors @ query) + query @ query
+                rows = np.arange(len(self.ids))
+            k = min(n_results, len(rows))
+            if k == 0:
+                top = np.array([], dtype=int)
+            else:
+                top = np.argpartition(distances, k - 1)[:k]
+                top = top[np.argsort(distances[top])]
+            results["ids"].append([self.ids[rows[i]] for i in top])
+            results["documents"].append([self.documents[rows[i]] for i in top])
+            results["metadatas"].append([self.metadatas[rows[i]] for i in top])
+            results["distances"].append([float(max(0.0, distances[i])) for i in top])
+        return results
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None,
+            limit: Optional[int] = None, include: Optional[List[str]] = None, **kwargs) -> Dict[str, Any]:
+        """Fetch stored chunks by id and/or metadata filter"""
+        include = include or ["documents", "metadatas"]
+        mask = self._mask(where)
+        rows = np.flatnonzero(mask) if mask is not None else np.arange(len(self.ids))
+        if ids is not None:
+            wanted = set(ids)
+            rows = [row for row in rows if self.ids[row] in wanted]
+        rows = list(rows)[:limit] if limit else list(rows)
+        result = {"ids": [self.ids[row] for row in rows]}
+        if "documents" in include:
+            result["documents"] = [self.documents[row] for row in rows]
+        if "metadatas" in include:
+            result["metadatas"] = [self.metadatas[row] for row in rows]
+        if "embeddings" in include:
+            result["embeddings"] = self.vectors[rows]
+        return result
@@ -0,0 +1,216 @@
+"""
+Cache Warm-up Module
+Pre-computes caches from historical queries and exports the hot query set
+"""
+
+import asyncio
+import json
+import os
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from loguru import logger
+
+from app.rag.coalescing import make_query_key
+
+
+@dataclass
+class WarmupStats:
+    """Outcome of a warm-up run"""
+    status: str = "disabled"
+    total: int = 0
+    warmed: int = 0
+    failed: int = 0
+    duration_seconds: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def _entry_key(entry: Dict[str, Any]) -> str:
+    """Key of a query entry: the query and every request field stored with it"""
+    params = {field: value for field, value in entry.items() if field not in ("query", "count")}
+    return make_query_key(entry["query"], **params)
+
+
+def load_warmup_queries(path: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Read historical queries, most important first
+
+    Accepts JSON lines ({"query": ..., "top_k": ..., "count": ...}, plus the
+    other request fields recorded) as written by HotQueryTracker.export, or
+    plain text with one query per line. Lines that are not valid JSON
+    objects are logged and skipped.
+
+    Args:
+        path: Query file
+        limit: Maximum number of queries to return
+
+    Returns:
+        List of entries with at least a "query" key
+    """
+    entries = []
+    seen = set()
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError as e:
+                    logger.warning("Skipping malformed warm-up query at {}:{}: {}", path, line_number, e)
+                    continue
+            else:
+                entry = {"query": line}
+            query = entry.get("query") if isinstance(entry, dict) else None
+            if not isinstance(query, str) or not query.strip():
+                continue
+            key = _entry_key(entry)
+            if key in seen:
+                continue
+            seen.add(key)
+            entries.append(entry)
+            if limit and len(entries) >= limit:
+                break
+    return entries
+
+
+class HotQueryTracker:
+    """
+    Counts served queries so the hot set can be exported for the next start
+    """
+
+    def __init__(self, max_tracked: int = 10000):
+        """
+        Initialize the tracker
+
+        Args:
+            max_tracked: Distinct queries kept before the long tail is trimmed
+        """
+        self.max_tracked = max_tracked
+        self._counts: Counter = Counter()
+        self._examples: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, query: str, **params: Any):
+        """
+        Count one served query
+
+        Args:
+            query: User query
+            **params: Request fields that change the answer (top_k,
+                temperature, filters...); None values are dropped. Queries
+                are counted separately per combination, so warming an entry
+                fills the cache keys its real requests hit.
+        """
+        entry = {"query": query, **{field: value for field, value in params.items() if value is not None}}
+        key = _entry_key(entry)
+        self._counts[key] += 1
+        self._examples[key] = entry
+        if len(self._counts) > self.max_tracked * 2:
+            # Trim the long tail so memory stays bounded under unique-query traffic
+            keep = dict(self._counts.most_common(self.max_tracked))
+            self._counts = Counter(keep)
+            self._examples = {key: self._examples[key] for key in keep}
+
+    def seed(self, entries: List[Dict[str, Any]]):
+        """
+        Add the counts of a previous run, so exporting keeps the historical hot set
+
+        Args:
+            entries: Entries from load_warmup_queries; a missing count counts once
+        """
+        for entry in entries:
+            key = _entry_key(entry)
+            try:
+                count = max(1, int(entry.get("count", 1)))
+            except (TypeError, ValueError):
+                count = 1
+            self._counts[key] += count
+            self._examples.setdefault(key, {field: value for field, value in entry.items() if field != "count"})
+
+    def top(self, n: int) -> List[Dict[str, Any]]:
+        """Most frequent queries with their counts"""
+        return [
+            {**self._examples[key], "count": count}
+            for key, count in self._counts.most_common(n)
+        ]
+
+    def export(self, path: str, n: int) -> int:
+        """
+        Write the top queries as JSON lines, readable by load_warmup_queries
+
+        Returns:
+            Number of queries written
+        """
+        top = self.top(n)
+        if not top:
+            return 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for entry in top:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        os.replace(temp_path, path)
+        return len(top)
+
+
+class CacheWarmer:
+    """
+    Runs a warm-up function over historical queries with bounded concurrency
+    """
+
+    def __init__(self, warm_fn: Callable[[Dict[str, Any]], Awaitable[Any]], concurrency: int = 4):
+        """
+        Initialize the warmer
+
+        Args:
+            warm_fn: Coroutine function warming the caches for one query entry
+            concurrency: Queries warmed at the same time
+        """
+        self.warm_fn = warm_fn
+        self.concurrency = max(1, concurrency)
+        self.stats = WarmupStats(status="pending")
+
+    async def warm(self, entries: List[Dict[str, Any]]) -> WarmupStats:
+        """
+        Warm the caches for every entry
+
+        Args:
+            entries: Query entries from load_warmup_queries
+
+        Returns:
+            WarmupStats, also kept in self.stats while running
+        """
+        self.stats = WarmupStats(status="running", total=len(entries))
+        semaphore = asyncio.Semaphore(self.concurrency)
+        started = time.perf_counter()
+
+        async def warm_one(entry: Dict[str, Any]):
+            async with semaphore:
+                try:
+                    await self.warm_fn(entry)
+                    self.stats.warmed += 1
+                except Exception as e:
+                    self.stats.failed += 1
+                    logger.debug("Warm-up failed for query: {}", e)
+
+        try:
+            await asyncio.gather(*(warm_one(entry) for entry in entries))
+            self.stats.status = "completed"
+        except asyncio.CancelledError:
+            self.stats.status = "cancelled"
+            raise
+        finally:
+            self.stats.duration_seconds = round(time.perf_counter() - started, 3)
+            logger.info(
+                "Cache warm-up {}: {}/{} queries warmed ({} failed) in {:.2f}s",
+                self.stats.status, self.stats.warmed, self.stats.total,
+                self.stats.failed, self.stats.duration_seconds
+            )
+        return self.stats
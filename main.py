@@ -4,11 +4,14 @@ EcoMarket RAG Solution - Main Entry Point
 FastAPI application for RAG-based product queries and recommendations
 """
 
+import asyncio
+import os
 import sys
 from pathlib import Path
 from contextlib import asynccontextmanager
+from typing import Optional
 
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from loguru import logger
@@ -16,14 +19,36 @@ from loguru import logger
 from app.rag.embeddings import EmbeddingService
 from app.rag.retriever import DocumentRetriever
 from app.rag.generator import ResponseGenerator
+from app.rag.parallel_embeddings import ParallelEmbeddingExecutor, backend_for
+from app.rag.resilience import CircuitOpenError
+from app.rag.snapshot import snapshot_exists
+from app.rag.cache import LRUCache
+from app.rag.warmup import CacheWarmer, HotQueryTracker, WarmupStats, load_warmup_queries
+from app.rag.coalescing import SingleFlight, make_query_key
+from app.rag.admission import (
+    AdmissionController,
+    ClientDisconnectedError,
+    Deadline,
+    DeadlineExceededError,
+    OverloadedError,
+    StageLimiter,
+    run_until_disconnect,
+)
 from app.config.settings import get_settings
+from utils.logging_config import LoggingConfig, hot_logger
+from utils.memory import memory_report
 # Setup logging
-logger.info("Logging initialized")
+LoggingConfig.setup_logging(get_settings())
 
 # Global instances
 embedding_service = None
 retriever = None
 generator = None
+admission = None
+answer_cache = None
+cache_warmer = None
+query_flights = SingleFlight()
+hot_queries = HotQueryTracker()
 
 
 class QueryRequest(BaseModel):
@@ -31,6 +56,14 @@ class QueryRequest(BaseModel):
     query: str = Field(..., min_length=1, max_length=500)
     top_k: int = Field(default=3, ge=1, le=10)
     temperature: float = Field(default=0.7, ge=0.0, le=1.0)
+    category: Optional[str] = Field(default=None, description="Restrict search to a policy partition")
+    language: Optional[str] = Field(default=None, description="Restrict search to chunks in this language")
+
+    def filters(self) -> Optional[dict]:
+        """Metadata filters pushed down to the retriever"""
+        filters = {"category": self.category, "language": self.language}
+        filters = {key: value for key, value in filters.items() if value is not None}
+        return filters or None
 
 
 class QueryResponse(BaseModel):
@@ -38,25 +71,80 @@ class QueryResponse(BaseModel):
     answer: str
     sources: list[dict]
     confidence: float
+    usage: Optional[dict] = None
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan events"""
-    global embedding_service, retriever, generator
+    global embedding_service, retriever, generator, admission, answer_cache, cache_warmer
     
     logger.info("Initializing EcoMarket RAG application...")
     settings = get_settings()
     
+    # Load shedding and per-stage concurrency limits
+    admission = AdmissionController(
+        max_concurrency=settings.max_concurrent_requests,
+        max_queue=settings.max_queued_requests,
+        queue_timeout=settings.queue_timeout_seconds,
+        retry_after=settings.retry_after_seconds
+    )
+    stage_limiter = StageLimiter({
+        "embedding": settings.embedding_concurrency,
+        "search": settings.search_concurrency,
+        "llm": settings.llm_concurrency,
+    })
+    
     # Initialize services
     embedding_service = EmbeddingService()
-    retriever = DocumentRetriever(embedding_service)
-    generator = ResponseGenerator()
+    ingestion_embedder = None
+    if settings.embedding_workers > 0 and not snapshot_exists(settings.index_snapshot_path):
+        # Multi-process embedding for the initial index build, only needed without a snapshot
+        ingestion_embedder = ParallelEmbeddingExecutor(
+            embedding_service.model_name,
+            backend=backend_for(embedding_service),
+            num_workers=settings.embedding_workers,
+            threads_per_worker=settings.embedding_worker_threads or None,
+            shard_size=settings.embedding_worker_shard_size
+        )
+    try:
+        retriever = DocumentRetriever(
+            embedding_service,
+            stage_limiter=stage_limiter,
+            ingestion_embedder=ingestion_embedder
+        )
+    finally:
+        if ingestion_embedder is not None:
+            ingestion_embedder.close()
+    generator = ResponseGenerator(stage_limiter=stage_limiter)
+    answer_cache = LRUCache(settings.answer_cache_size)
+    
+    # Keep the historical hot set: this run's counts add to the exported ones
+    if settings.warmup_export_path and os.path.isfile(settings.warmup_export_path):
+        hot_queries.seed(load_warmup_queries(settings.warmup_export_path))
+    
+    # Warm caches from the hot query set of previous runs
+    warmup_task = None
+    if settings.warmup_queries_path and os.path.isfile(settings.warmup_queries_path):
+        entries = load_warmup_queries(settings.warmup_queries_path, settings.warmup_max_queries)
+        cache_warmer = CacheWarmer(warm_query, concurrency=settings.warmup_concurrency)
+        if settings.warmup_blocking:
+            await cache_warmer.warm(entries)
+        else:
+            warmup_task = asyncio.create_task(cache_warmer.warm(entries))
     
     logger.info("Application initialized successfully")
     yield
     
     logger.info("Shutting down application...")
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+        await asyncio.gather(warmup_task, return_exceptions=True)
+    if settings.warmup_export_path:
+        exported = hot_queries.export(settings.warmup_export_path, settings.warmup_max_queries)
+        logger.info("Exported {} hot queries to {}", exported, settings.warmup_export_path)
+    # Flush records still queued for the log writer thread
+    await logger.complete()
 
 
 app = FastAPI(
@@ -92,38 +180,129 @@ async def health_check():
         "status": "healthy",
         "embedding_service": embedding_service is not None,
         "retriever": retriever is not None,
-        "generator": generator is not None
+        "generator": generator is not None,
+        "coalescing": query_flights.stats(),
+        "admission": admission.stats() if admission else None,
+        "llm": generator.resilient_caller.stats() if generator else None,
+        "caches": {
+            **(retriever.cache_stats() if retriever else {}),
+            "answer": answer_cache.stats() if answer_cache is not None else None
+        },
+        "warmup": (cache_warmer.stats if cache_warmer else WarmupStats()).to_dict()
     }
 
 
-@app.post("/query", response_model=QueryResponse)
-async def query_rag(request: QueryRequest):
-    """Process RAG query"""
-    try:
-        logger.info(f"Processing query: {request.query}")
-        
+@app.get("/debug/memory")
+def debug_memory():
+    """Memory breakdown by component (opt-in, ENABLE_DEBUG_ENDPOINTS)"""
+    if not get_settings().enable_debug_endpoints:
+        raise HTTPException(status_code=404, detail="Not Found")
+    caches = {"answer": answer_cache}
+    if retriever:
+        caches.update(embedding=retriever.embedding_cache, retrieval=retriever.retrieval_cache)
+    return memory_report(
+        embedding_service=embedding_service,
+        collection=retriever.collection if retriever else None,
+        caches=caches,
+        profiles={"ingestion": retriever.ingestion_profile} if retriever and retriever.ingestion_profile else None
+    )
+
+
+async def run_query_pipeline(request: QueryRequest, deadline: Deadline) -> QueryResponse:
+    """Run the embed → search → LLM pipeline for a query"""
+    async with admission.admit(deadline):
         # Retrieve relevant documents
         documents = await retriever.retrieve(
             request.query,
-            top_k=request.top_k
+            top_k=request.top_k,
+            filters=request.filters(),
+            deadline=deadline
         )
         
         # Generate response
         response = await generator.generate(
             query=request.query,
             documents=documents,
-            temperature=request.temperature
+            temperature=request.temperature,
+            deadline=deadline
         )
+    
+    return QueryResponse(
+        answer=response["answer"],
+        sources=response["sources"],
+        confidence=response["confidence"],
+        usage=response.get("usage")
+    )
+
+
+async def execute_query(request: QueryRequest, deadline: Deadline) -> QueryResponse:
+    """Execute a query, sharing the execution with identical in-flight queries"""
+    key = make_query_key(
+        request.query,
+        top_k=request.top_k,
+        temperature=request.temperature,
+        filters=request.filters()
+    )
+    cached = answer_cache.get(key) if answer_cache is not None else None
+    if cached is not None:
+        return cached
+
+    if get_settings().enable_request_coalescing:
+        # Identical concurrent queries share a single pipeline execution
+        response = await query_flights.do(key, lambda: run_query_pipeline(request, deadline))
+    else:
+        response = await run_query_pipeline(request, deadline)
+
+    if answer_cache is not None:
+        answer_cache.set(key, response)
+    return response
+
+
+async def warm_query(entry: dict):
+    """Warm the embedding, retrieval and (optionally) answer caches for one historical query"""
+    settings = get_settings()
+    request = QueryRequest(**{field: entry[field] for field in QueryRequest.model_fields if field in entry})
+    if settings.warmup_include_answers and answer_cache is not None and answer_cache.enabled:
+        await execute_query(request, Deadline(settings.request_timeout_seconds))
+    else:
+        await retriever.retrieve(request.query, top_k=request.top_k, filters=request.filters())
+
+
+@app.post("/query", response_model=QueryResponse)
+async def query_rag(request: QueryRequest, http_request: Request):
+    """Process RAG query"""
+    try:
+        hot_logger.info("Processing query ({} chars, top_k={})", len(request.query), request.top_k)
+        hot_logger.debug("Query text: {}", request.query)
         
-        return QueryResponse(
-            answer=response["answer"],
-            sources=response["sources"],
-            confidence=response["confidence"]
-        )
+        deadline = Deadline(get_settings().request_timeout_seconds)
+        # Cancelled if the client disconnects: the llm call is aborted, embedding
+        # and search steps already running in a thread finish in the background
+        response = await run_until_disconnect(http_request, execute_query(request, deadline))
+        # Only answered queries feed the hot set, with the fields of their cache key
+        hot_queries.record(request.query, **request.model_dump(exclude={"query"}))
+        return response
         
+    except OverloadedError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except CircuitOpenError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, round(e.retry_after)))}
+        )
+    except DeadlineExceededError as e:
+        logger.warning("Query deadline exceeded: {}", e)
+        raise HTTPException(status_code=504, detail=str(e))
+    except ClientDisconnectedError as e:
+        raise HTTPException(status_code=499, detail=str(e))
     except Exception as e:
-        logger.error(f"Error processing query: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+        logger.error("Error processing query: {}: {}", type(e).__name__, e)
+        raise HTTPException(status_code=500, detail=str(e) or type(e).__name__)
 
 
 if __name__ == "__main__":
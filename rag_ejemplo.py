@@ -1,85 +1,235 @@
 # -*- coding: utf-8 -*-
-"""Ejemplo de Sistema RAG con LangChain
-
-Automatically generated by Colab.
-
-Original file is located at
-    https://colab.research.google.com/drive/1dharcN8iZSlDCNiPs92YE00-OH_eV3XH
 """
-
-# -*- coding: utf-8 -*-
-# Este script demuestra un sistema RAG (Generación Aumentada por Recuperación) simple
-# utilizando LangChain para un caso de estudio de atención al cliente.
-
-# Importar las librerías necesarias
-from langchain_community.llms import Ollama
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import OllamaEmbeddings
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.chains import RetrievalQA
-from langchain_community.document_loaders import TextLoader
-import os
-
-# Paso 1: Definir la base de conocimiento de la empresa (documentos).
-# En un caso real, esto serían archivos PDF, TXT, bases de datos, etc.
-# Aquí usamos una cadena de texto simple para el ejercicio.
-
-# Documento de ejemplo con información de EcoMarket
-DOCUMENTO_ECO_MARKET = """
-Política de Devoluciones de EcoMarket:
-
-Nuestra política de devoluciones permite a los clientes devolver productos dentro de los 30 días posteriores a la fecha de compra. Para ser elegible para una devolución, el artículo debe estar sin usar, en su embalaje original y en las mismas condiciones en que lo recibió. Los productos perecederos, como alimentos y flores, no son elegibles para devolución. Las devoluciones de ropa de segunda mano también están sujetas a una revisión estricta para garantizar que el artículo no haya sido usado después de la compra. Para iniciar una devolución, visite nuestra sección de ayuda en el sitio web y siga los pasos.
+CLI del sistema RAG de EcoMarket
+
+Usa el mismo pipeline que la API (main.app): DocumentRetriever abre el índice
+persistido (snapshot generado con `python -m app.rag.build_index`) sin volver a
+calcular embeddings, y ResponseGenerator transmite la respuesta del LLM a medida
+que se genera. Con --reindex se indexan los PDFs locales como lo hace
+build_index y se reemplaza el snapshot antes de responder; --include-blob suma
+los documentos de Azure Blob Storage (requiere credenciales).
+
+En modo batch las cachés de embeddings y de búsqueda se vacían antes de cada
+pregunta, para que p50/p95 midan el pipeline completo y no aciertos de caché.
+
+Uso:
+    python rag_ejemplo.py                                 # modo interactivo
+    python rag_ejemplo.py --questions preguntas.txt       # modo batch con tiempos por etapa
+    python rag_ejemplo.py --index ./data/index_snapshot --top-k 4
+
+El archivo de preguntas admite una pregunta por línea (las líneas vacías y las
+que empiezan con # se ignoran) o JSON lines con la clave "query", como el
+archivo de consultas frecuentes exportado por la API.
 """
 
-# Paso 2: Crear el modelo de embeddings.
-# Este modelo convierte el texto de los documentos en vectores.
-# Usamos un modelo de Ollama para el ejemplo, que se ejecuta localmente.
-# NOTA: Asegúrate de tener Ollama instalado y un modelo como `llama2` descargado (`ollama pull llama2`)
-try:
-    embeddings = OllamaEmbeddings(model="llama2")
-except Exception as e:
-    print(f"Error al inicializar el modelo de embeddings de Ollama: {e}")
-    print("Asegúrate de tener Ollama corriendo en tu máquina y el modelo 'llama2' descargado.")
-    exit()
-
-# Paso 3: Dividir el documento en fragmentos (chunks) para una búsqueda eficiente.
-text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-docs = text_splitter.create_documents([DOCUMENTO_ECO_MARKET])
-
-# Paso 4: Crear la base de datos vectorial en memoria y cargar los fragmentos.
-# Usamos ChromaDB, que es fácil de configurar y funciona en memoria para este ejemplo.
-print("Creando y cargando la base de datos vectorial...")
-vectorstore = Chroma.from_documents(documents=docs, embedding=embeddings)
-
-# Paso 5: Configurar el modelo de lenguaje (LLM).
-# Usamos un modelo de Ollama que se ejecuta localmente.
-# Esto asegura que el proceso se puede ejecutar sin claves API externas.
-try:
-    llm = Ollama(model="llama2")
-except Exception as e:
-    print(f"Error al inicializar el modelo LLM de Ollama: {e}")
-    print("Asegúrate de tener Ollama corriendo en tu máquina y el modelo 'llama2' descargado.")
-    exit()
-
-# Paso 6: Crear el "chain" de RAG.
-# Un `chain` une el recuperador de documentos y el LLM.
-# El "retriever" buscará los documentos más relevantes.
-# Luego, el "LLM" generará la respuesta usando esos documentos como contexto.
-retriever = vectorstore.as_retriever()
-qa_chain = RetrievalQA.from_chain_type(llm=llm, chain_type="stuff", retriever=retriever)
-
-# Paso 7: Interactuar con el sistema RAG.
-print("\n¡El sistema RAG para EcoMarket está listo!")
-print("Escribe una pregunta y presiona Enter. Escribe 'salir' para terminar.")
-
-while True:
-    pregunta = input("\nTu pregunta: ")
-    if pregunta.lower() == 'salir':
-        break
-
-    # Realizar la consulta
-    print("Buscando y generando respuesta...")
-    respuesta = qa_chain.run(pregunta)
-
-    print("\nRespuesta del Asistente:\n")
-    print(respuesta)
\ No newline at end of file
+import argparse
+import asyncio
+import json
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+from app.config.settings import get_settings
+from app.rag import build_index
+from app.rag.admission import Deadline
+from app.rag.embeddings import EmbeddingService
+from app.rag.generator import ResponseGenerator
+from app.rag.resilience import LatencyTracker
+from app.rag.retriever import DocumentRetriever
+from app.rag.snapshot import snapshot_exists
+
+
+DEFAULT_INDEX_PATH = "./data/index_snapshot"
+# Igual que QueryRequest.top_k de la API (main.py)
+DEFAULT_TOP_K = 3
+STAGES = ("embedding", "search", "first_token", "llm", "total")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Consulta el sistema RAG de EcoMarket desde la terminal")
+    parser.add_argument("--index", default=settings.index_snapshot_path or DEFAULT_INDEX_PATH,
+                        help="Snapshot del índice (python -m app.rag.build_index)")
+    parser.add_argument("--reindex", action="store_true",
+                        help="Indexar los PDFs y reemplazar el snapshot antes de iniciar (lento)")
+    parser.add_argument("--include-blob", action="store_true",
+                        help="Con --reindex, indexar también Azure Blob Storage (requiere credenciales)")
+    parser.add_argument("--questions", default=None,
+                        help="Archivo de preguntas: activa el modo batch con tiempos por etapa")
+    parser.add_argument("--top-k", type=int, default=DEFAULT_TOP_K,
+                        help="Documentos recuperados por pregunta")
+    parser.add_argument("--temperature", type=float, default=settings.temperature,
+                        help="Temperatura del LLM")
+    parser.add_argument("--show-answers", action="store_true",
+                        help="En modo batch, imprimir también las respuestas")
+    parser.add_argument("--log-level", default="WARNING", help="Nivel de log de la aplicación")
+    return parser.parse_args(argv)
+
+
+def read_questions(path: str) -> List[str]:
+    """Preguntas del archivo, en orden y con repeticiones"""
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            questions.append(json.loads(line)["query"] if line.startswith("{") else line)
+    return questions
+
+
+def build_pipeline(args: argparse.Namespace):
+    """Crea el retriever sobre el índice persistido y el generador"""
+    if args.reindex:
+        print(f"Indexando los PDFs en {args.index}...")
+        build_args = ["--output", args.index]
+        if not args.include_blob:
+            build_args.append("--skip-blob")
+        if build_index.main(build_args) != 0:
+            return None, None
+    elif not snapshot_exists(args.index):
+        print(f"No se encontró un índice en {args.index}.")
+        print("Genéralo con: python -m app.rag.build_index --output " + args.index)
+        print("o usa --reindex para indexar los PDFs al iniciar.")
+        return None, None
+    retriever = DocumentRetriever(EmbeddingService(), snapshot_path=args.index)
+    generator = ResponseGenerator()
+    return retriever, generator
+
+
+async def answer_question(retriever: DocumentRetriever, generator: ResponseGenerator,
+                          question: str, top_k: int, temperature: float,
+                          stream_to=None, use_cache: bool = True) -> Dict[str, Any]:
+    """
+    Ejecuta embedding → búsqueda → LLM para una pregunta, midiendo cada etapa
+
+    Args:
+        retriever: Retriever del pipeline
+        generator: Generador del pipeline
+        question: Pregunta del usuario
+        top_k: Documentos recuperados
+        temperature: Temperatura del LLM
+        stream_to: Archivo donde escribir la respuesta a medida que llega
+        use_cache: Si es False, se vacían las cachés del retriever antes de
+            empezar, para medir cada etapa sin aciertos de caché
+
+    Returns:
+        Respuesta, fuentes, documentos y tiempos por etapa en segundos
+    """
+    if not use_cache:
+        retriever.embedding_cache.clear()
+        retriever.retrieval_cache.clear()
+    deadline = Deadline(get_settings().request_timeout_seconds)
+    timings = {}
+    started = time.perf_counter()
+
+    await retriever.embed_query(question, deadline=deadline)
+    timings["embedding"] = time.perf_counter() - started
+
+    # retrieve reutiliza el embedding recién calculado (caché de embeddings)
+    search_started = time.perf_counter()
+    documents = await retriever.retrieve(question, top_k=top_k, deadline=deadline)
+    timings["search"] = time.perf_counter() - search_started
+
+    llm_started = time.perf_counter()
+
+    def on_text(text: str):
+        timings.setdefault("first_token", time.perf_counter() - llm_started)
+        if stream_to is not None:
+            stream_to.write(text)
+            stream_to.flush()
+
+    result = await generator.generate(question, documents, temperature=temperature,
+                                      deadline=deadline, on_text=on_text)
+    timings["llm"] = time.perf_counter() - llm_started
+    timings.setdefault("first_token", timings["llm"])
+    timings["total"] = time.perf_counter() - started
+
+    return {"answer": result["answer"], "sources": result["sources"], "documents": documents, "timings": timings}
+
+
+def format_timings(timings: Dict[str, float]) -> str:
+    return "  ".join(f"{stage}={timings[stage] * 1000:.0f}ms" for stage in STAGES if stage in timings)
+
+
+async def interactive(retriever: DocumentRetriever, generator: ResponseGenerator, args: argparse.Namespace):
+    """Bucle de preguntas y respuestas, con la respuesta transmitida en vivo"""
+    print("\n¡El sistema RAG para EcoMarket está listo!")
+    print("Escribe una pregunta y presiona Enter. Escribe 'salir' para terminar.")
+    while True:
+        try:
+            question = input("\nTu pregunta: ").strip()
+        except EOFError:
+            break
+        if question.lower() == "salir":
+            break
+        if not question:
+            continue
+        print("\nRespuesta del Asistente:\n")
+        try:
+            result = await answer_question(
+                retriever, generator, question, args.top_k, args.temperature, stream_to=sys.stdout
+            )
+        except Exception as e:
+            print(f"\nError al responder: {e}")
+            continue
+        print()
+        citations = []
+        for source in result["sources"]:
+            citations.extend(citation for citation in [source["citation"], *source["also_in"]] if citation)
+        if citations:
+            print("\nFuentes: " + "; ".join(citations))
+        print(f"({format_timings(result['timings'])})")
+
+
+async def batch(retriever: DocumentRetriever, generator: ResponseGenerator, args: argparse.Namespace) -> int:
+    """Responde las preguntas de un archivo e imprime los tiempos por etapa, sin cachés"""
+    questions = read_questions(args.questions)
+    if not questions:
+        print(f"No hay preguntas en {args.questions}")
+        return 1
+
+    trackers = {stage: LatencyTracker(window=len(questions)) for stage in STAGES}
+    failures = 0
+    for i, question in enumerate(questions, 1):
+        try:
+            result = await answer_question(retriever, generator, question, args.top_k, args.temperature,
+                                           use_cache=False)
+        except Exception as e:
+            failures += 1
+            print(f"[{i}/{len(questions)}] ERROR {type(e).__name__}: {e} | {question}")
+            continue
+        for stage, seconds in result["timings"].items():
+            trackers[stage].record(seconds)
+        print(f"[{i}/{len(questions)}] {format_timings(result['timings'])} | {question}")
+        if args.show_answers:
+            print(f"    {result['answer']}\n")
+
+    print(f"\nResumen ({len(questions) - failures} respondidas, {failures} con error):")
+    print(f"{'etapa':<12}{'p50':>10}{'p95':>10}{'max':>10}")
+    for stage, tracker in trackers.items():
+        if not len(tracker):
+            continue
+        p50, p95, worst = (tracker.percentile(q) * 1000 for q in (0.5, 0.95, 1.0))
+        print(f"{stage:<12}{p50:>8.0f}ms{p95:>8.0f}ms{worst:>8.0f}ms")
+    return 1 if failures else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level.upper())
+
+    retriever, generator = build_pipeline(args)
+    if retriever is None:
+        return 1
+    if args.questions:
+        return asyncio.run(batch(retriever, generator, args))
+    asyncio.run(interactive(retriever, generator, args))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""
+Unit Tests for admission control, stage limits and deadlines
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.rag.admission import (
+    AdmissionController,
+    Deadline,
+    DeadlineExceededError,
+    OverloadedError,
+    StageLimiter,
+    acquire_within,
+)
+
+
+class TestDeadline:
+    """Tests for Deadline"""
+
+    def test_unbounded_deadline(self):
+        deadline = Deadline(None)
+        assert deadline.remaining() is None
+        assert not deadline.expired
+
+    def test_expired_deadline_raises(self):
+        deadline = Deadline(0.001)
+        time.sleep(0.01)
+        assert deadline.expired
+        with pytest.raises(DeadlineExceededError):
+            deadline.check("llm")
+
+
+class TestAdmissionController:
+    """Tests for AdmissionController"""
+
+    @pytest.mark.asyncio
+    async def test_rejects_when_queue_full(self):
+        controller = AdmissionController(max_concurrency=1, max_queue=0, retry_after=3)
+        release = asyncio.Event()
+
+        async def hold():
+            async with controller.admit():
+                await release.wait()
+
+        holder = asyncio.ensure_future(hold())
+        await asyncio.sleep(0)
+
+        with pytest.raises(OverloadedError) as exc_info:
+            async with controller.admit():
+                pass
+        assert exc_info.value.retry_after == 3
+        assert controller.rejected == 1
+
+        release.set()
+        await holder
+        assert controller.active == 0
+
+    @pytest.mark.asyncio
+    async def test_rejects_after_queue_timeout(self):
+        controller = AdmissionController(max_concurrency=1, max_queue=5, queue_timeout=0.05)
+        release = asyncio.Event()
+
+        async def hold():
+            async with controller.admit():
+                await release.wait()
+
+        holder = asyncio.ensure_future(hold())
+        await asyncio.sleep(0)
+
+        with pytest.raises(OverloadedError):
+            async with controller.admit():
+                pass
+
+        release.set()
+        await holder
+
+
+class TestStageLimiter:
+    """Tests for StageLimiter"""
+
+    @pytest.mark.asyncio
+    async def test_stage_concurrency_is_bounded(self):
+        limiter = StageLimiter({"embedding": 2})
+        lock = threading.Lock()
+        running = 0
+        peak = 0
+
+        def work():
+            nonlocal running, peak
+            with lock:
+                running += 1
+                peak = max(peak, running)
+            time.sleep(0.02)
+            with lock:
+                running -= 1
+            return "ok"
+
+        results = await asyncio.gather(*(limiter.run("embedding", work) for _ in range(6)))
+
+        assert results == ["ok"] * 6
+        assert peak <= 2
+
+    @pytest.mark.asyncio
+    async def test_deadline_enforced_during_stage(self):
+        limiter = StageLimiter()
+
+        with pytest.raises(DeadlineExceededError):
+            await limiter.run("llm", time.sleep, 0.2, deadline=Deadline(0.02))
+
+    @pytest.mark.asyncio
+    async def test_slot_is_released_when_cancelled(self):
+        limiter = StageLimiter({"llm": 1})
+        entered = asyncio.Event()
+
+        async def hold():
+            async with limiter.slot("llm"):
+                entered.set()
+                await asyncio.sleep(10)
+
+        task = asyncio.ensure_future(hold())
+        await entered.wait()
+        with pytest.raises(DeadlineExceededError):
+            async with limiter.slot("llm", deadline=Deadline(0.02)):
+                pass
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+        async with limiter.slot("llm", deadline=Deadline(0.1)):
+            pass
+
+
+class TestAcquireWithin:
+    """Tests for acquire_within"""
+
+    @pytest.mark.asyncio
+    async def test_timeout_keeps_permits(self):
+        semaphore = asyncio.Semaphore(1)
+        await semaphore.acquire()
+
+        assert not await acquire_within(semaphore, 0.01)
+        semaphore.release()
+        assert await acquire_within(semaphore, 0.01)
+        semaphore.release()
+        assert semaphore._value == 1
+
+    @pytest.mark.asyncio
+    async def test_permit_granted_at_the_timeout_is_returned(self):
+        semaphore = asyncio.Semaphore(0)
+        waiter = asyncio.ensure_future(acquire_within(semaphore, 0.05))
+        await asyncio.sleep(0)
+        # Grant the permit, then cancel the waiter before it can resume
+        semaphore.release()
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+
+        assert semaphore._value == 1
@@ -0,0 +1,108 @@
+"""
+Unit Tests for the streaming, page-aware chunker
+"""
+
+import random
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from app.rag.chunking import StreamingChunker
+
+
+WORDS = "politica devolucion garantia producto cliente dias compra tienda reembolso".split()
+
+
+def _sample_pages(count=20, seed=7, separator="\n\n", min_words=20, max_words=120):
+    rng = random.Random(seed)
+
+    def paragraph():
+        return " ".join(rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words)))
+
+    return [
+        (number, separator.join(paragraph() for _ in range(rng.randint(2, 8))))
+        for number in range(1, count + 1)
+    ]
+
+
+def _assert_covers(chunks, full_text, chunk_size):
+    """Chunks are the text at their offsets, in order, and miss no visible character"""
+    covered = [False] * len(full_text)
+    previous_start = -1
+    for chunk in chunks:
+        assert full_text[chunk.char_start:chunk.char_end] == chunk.text
+        assert len(chunk.text) <= chunk_size
+        assert chunk.char_start > previous_start
+        previous_start = chunk.char_start
+        covered[chunk.char_start:chunk.char_end] = [True] * len(chunk.text)
+    assert all(covered[i] for i, char in enumerate(full_text) if not char.isspace())
+
+
+class TestStreamingChunker:
+    """Tests for StreamingChunker"""
+
+    def test_matches_full_text_splitting(self):
+        pages = _sample_pages()
+        full_text = "\n".join(text for _, text in pages)
+        splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+        expected = [doc.page_content for doc in splitter.create_documents([full_text])]
+
+        chunks = list(StreamingChunker(chunk_size=1000, chunk_overlap=200).chunk_pages(pages))
+
+        assert [chunk.text for chunk in chunks] == expected
+        assert [chunk.index for chunk in chunks] == list(range(len(expected)))
+
+    def test_offsets_and_pages(self):
+        pages = _sample_pages()
+        full_text = "\n".join(text for _, text in pages)
+        page_starts = []
+        offset = 0
+        for number, text in pages:
+            page_starts.append((offset, offset + len(text), number))
+            offset += len(text) + 1
+
+        for chunk in StreamingChunker(chunk_size=500, chunk_overlap=100, window_chunks=2).chunk_pages(pages):
+            assert full_text[chunk.char_start:chunk.char_end] == chunk.text
+            assert chunk.page_start <= chunk.page_end
+            first = next(number for start, end, number in page_starts if start <= chunk.char_start <= end)
+            assert chunk.page_start == first
+
+    def test_empty_pages_produce_no_chunks(self):
+        assert list(StreamingChunker().chunk_pages([(1, ""), (2, "   ")])) == []
+
+    def test_single_newline_pages(self):
+        pages = _sample_pages(seed=1, separator="\n", min_words=2, max_words=15)
+        full_text = "\n".join(text for _, text in pages)
+        splitter = RecursiveCharacterTextSplitter(chunk_size=300, chunk_overlap=60)
+
+        chunks = list(StreamingChunker(chunk_size=300, chunk_overlap=60, window_chunks=2).chunk_pages(pages))
+
+        assert [chunk.text for chunk in chunks] == splitter.split_text(full_text)
+        _assert_covers(chunks, full_text, 300)
+
+    def test_long_lines_and_mixed_separators(self):
+        pages = _sample_pages(seed=5, separator="\n", min_words=10, max_words=90)
+        pages[3] = (4, pages[3][1].replace("\n", "\n\n", 1))
+        full_text = "\n".join(text for _, text in pages)
+
+        chunks = list(StreamingChunker(chunk_size=300, chunk_overlap=60, window_chunks=2).chunk_pages(pages))
+
+        _assert_covers(chunks, full_text, 300)
+
+    def test_pages_without_separators(self):
+        rng = random.Random(11)
+        pages = [(number, "".join(rng.choice("abcdef") for _ in range(rng.randint(0, 900))))
+                 for number in range(1, 12)]
+        full_text = "\n".join(text for _, text in pages)
+
+        chunks = list(StreamingChunker(chunk_size=200, chunk_overlap=40, window_chunks=3).chunk_pages(pages))
+
+        _assert_covers(chunks, full_text, 200)
+        assert chunks[-1].page_end == 11
+
+    def test_repeated_short_chunks_keep_their_own_offsets(self):
+        pages = [(1, "politica garantia producto\n\nproducto\n\ndevolucion reembolso cliente")]
+
+        chunks = list(StreamingChunker(chunk_size=30, chunk_overlap=10).chunk_pages(pages))
+
+        assert [chunk.text for chunk in chunks][1] == "producto"
+        _assert_covers(chunks, pages[0][1], 30)
@@ -0,0 +1,71 @@
+"""
+Unit Tests for single-flight request coalescing
+"""
+
+import asyncio
+
+import pytest
+
+from app.rag.coalescing import SingleFlight, make_query_key
+
+
+class TestQueryKey:
+    """Tests for coalescing keys"""
+
+    def test_normalized_query_shares_key(self):
+        assert make_query_key("  ¿Política de  DEVOLUCIÓN? ", top_k=3) == make_query_key("¿política de devolución?", top_k=3)
+
+    def test_parameters_change_key(self):
+        assert make_query_key("garantía", top_k=3) != make_query_key("garantía", top_k=5)
+
+
+class TestSingleFlight:
+    """Tests for SingleFlight"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_share_execution(self):
+        flights = SingleFlight()
+        calls = 0
+
+        async def work():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return "answer"
+
+        results = await asyncio.gather(*(flights.do("k", work) for _ in range(10)))
+
+        assert results == ["answer"] * 10
+        assert calls == 1
+        assert flights.coalesced == 9
+        assert flights.in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_failure_propagates_to_every_waiter(self):
+        flights = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream down")
+
+        results = await asyncio.gather(*(flights.do("k", work) for _ in range(3)), return_exceptions=True)
+
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert flights.in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_does_not_cancel_others(self):
+        flights = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.05)
+            return 42
+
+        first = asyncio.ensure_future(flights.do("k", work))
+        second = asyncio.ensure_future(flights.do("k", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+
+        assert await second == 42
+        with pytest.raises(asyncio.CancelledError):
+            await first
@@ -0,0 +1,136 @@
+"""
+Unit Tests for chunk deduplication
+"""
+
+import json
+import uuid
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from app.rag.dedup import ChunkDeduplicator, content_hash
+from app.rag.retriever import DocumentRetriever
+
+
+POLICY = (
+    "La garantía de los productos electrónicos cubre defectos de fabricación durante dos años "
+    "desde la fecha de compra, siempre que el cliente conserve el ticket y el producto no presente "
+    "daños por mal uso. Los accesorios tienen seis meses de cobertura y las baterías un año, salvo "
+    "indicación distinta en la factura. Para iniciar un reclamo, el cliente debe contactar al "
+    "servicio de atención con el número de pedido y una descripción del problema."
+)
+
+
+class FakeEmbedder:
+    """Deterministic embedder standing in for the sentence-transformers model"""
+    model_name = "fake-model"
+
+    def embed_text(self, text):
+        return self.embed_batch([text])[0]
+
+    def embed_batch(self, texts):
+        return np.array([[len(text) % 7, text.count("a"), 1.0] for text in texts], dtype=np.float32)
+
+
+class TestChunkDeduplicator:
+    """Tests for ChunkDeduplicator"""
+
+    def test_exact_duplicates_ignore_whitespace_and_case(self):
+        dedup = ChunkDeduplicator()
+        assert content_hash(POLICY) == content_hash("  " + POLICY.upper().replace(" ", "\n  "))
+        assert dedup.check("a", POLICY) is None
+        assert dedup.check("b", POLICY.upper()) == "a"
+        assert dedup.stats() == {"kept": 1, "exact_duplicates": 1, "near_duplicates": 0}
+
+    def test_near_duplicates(self):
+        dedup = ChunkDeduplicator(threshold=0.8, near_duplicates=True)
+        assert dedup.check("a", POLICY) is None
+        assert dedup.check("b", POLICY.replace("Para iniciar un reclamo", "Para iniciar el reclamo")) == "a"
+        assert dedup.stats()["near_duplicates"] == 1
+
+    def test_chunks_differing_in_a_number_are_kept(self):
+        dedup = ChunkDeduplicator(threshold=0.8, near_duplicates=True)
+        thirty_days = POLICY + " Las devoluciones se aceptan dentro de los 30 días posteriores a la compra."
+        fifteen_days = thirty_days.replace("30 días", "15 días")
+        assert dedup.check("a", thirty_days) is None
+        assert dedup.check("b", fifteen_days) is None
+        assert dedup.stats() == {"kept": 2, "exact_duplicates": 0, "near_duplicates": 0}
+
+    def test_distinct_chunks_are_kept(self):
+        dedup = ChunkDeduplicator()
+        assert dedup.check("a", POLICY) is None
+        assert dedup.check("b", "Los envíos internacionales tardan entre cinco y diez días hábiles.") is None
+        assert dedup.check("c", POLICY[:len(POLICY) // 2]) is None
+
+    def test_near_duplicates_are_off_by_default(self):
+        dedup = ChunkDeduplicator()
+        dedup.check("a", POLICY)
+        assert dedup.check("b", POLICY.replace("Para iniciar un reclamo", "Para iniciar el reclamo")) is None
+
+
+class TestIngestionDedup:
+    """Tests for deduplication in DocumentRetriever ingestion"""
+
+    @pytest.fixture
+    def retriever(self):
+        return DocumentRetriever(
+            FakeEmbedder(),
+            collection_name=f"test_dedup_{uuid.uuid4().hex}",
+            use_snapshot=False,
+            index_on_init=False
+        )
+
+    def test_same_file_from_two_sources_is_indexed_once(self, retriever):
+        pages = [(1, POLICY), (2, "Las devoluciones se aceptan dentro de los 30 días posteriores a la compra.")]
+        retriever.ingestion_batch_size = 1
+        with patch("app.rag.retriever.iter_pdf_pages", side_effect=lambda path: iter(pages)):
+            retriever._index_pdf("/docs/garantia.pdf", source="local", origin="garantia.pdf")
+            retriever._flush_chunks()
+            retriever._index_pdf("/tmp/0_garantia.pdf", source="blob", origin="politicas/garantia.pdf")
+            retriever._flush_chunks()
+
+        contents = retriever.collection.get(include=["metadatas"])
+        assert retriever.collection.count() == retriever.deduplicator.stats()["kept"]
+        assert all(metadata["source"] == "local" for metadata in contents["metadatas"])
+        duplicate_sources = json.loads(contents["metadatas"][0]["duplicate_sources"])
+        assert duplicate_sources[0]["filename"] == "garantia.pdf"
+        assert duplicate_sources[0]["source"] == "blob"
+
+    def test_chunk_ids_are_unique_per_source(self, retriever):
+        with patch("app.rag.retriever.iter_pdf_pages", side_effect=lambda path: iter([(1, POLICY)])):
+            retriever.deduplicator = None
+            retriever._index_pdf("/docs/garantia.pdf", source="local", origin="garantia.pdf")
+            retriever._index_pdf("/tmp/0_garantia.pdf", source="blob", origin="garantia.pdf")
+            retriever._flush_chunks()
+
+        assert retriever.collection.count() == 2
+
+    @pytest.mark.asyncio
+    async def test_chunk_shared_by_two_categories_is_kept_in_each(self, retriever):
+        shared = "Las devoluciones se aceptan dentro de los 30 días posteriores a la compra."
+        with patch("app.rag.retriever.iter_pdf_pages", side_effect=lambda path: iter([(1, shared)])):
+            retriever._index_pdf("/docs/garantia.pdf", source="local", origin="garantia.pdf")
+            retriever._index_pdf("/docs/devoluciones.pdf", source="local", origin="devoluciones.pdf")
+            retriever._flush_chunks()
+
+        assert retriever.collection.count() == 2
+        for category, filename in (("garantia", "garantia.pdf"), ("devoluciones", "devoluciones.pdf")):
+            documents = await retriever.retrieve(shared, top_k=1, filters={"category": category})
+            assert [document["content"] for document in documents] == [shared]
+            assert documents[0]["metadata"]["filename"] == filename
+
+    def test_dedup_state_is_released_after_build(self, retriever):
+        def index_local(docs_folder):
+            retriever._index_pdf("/docs/garantia.pdf", source="local", origin="garantia.pdf")
+            retriever._index_pdf("/docs/garantia_copia.pdf", source="local", origin="garantia_copia.pdf")
+
+        with patch("app.rag.retriever.iter_pdf_pages", side_effect=lambda path: iter([(1, POLICY)])), \
+                patch.object(retriever, "load_and_index_pdfs", side_effect=index_local):
+            retriever.build_index(include_blob=False)
+
+        assert retriever.collection.count() == 1
+        assert retriever.deduplicator.stats()["exact_duplicates"] == 1
+        assert retriever._chunk_metadata == {}
+        assert not retriever.deduplicator._hashes and not retriever.deduplicator._buckets
+
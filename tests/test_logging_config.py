@@ -0,0 +1,57 @@
+"""
+Unit Tests for the logging layer
+"""
+
+import logging
+from types import SimpleNamespace
+
+from loguru import logger
+
+from utils.logging_config import HotPathLogger, LevelSampler, LoggingConfig, parse_sample_rates
+
+
+class TestSampling:
+    """Tests for hot-path log sampling"""
+
+    def test_parse_sample_rates(self):
+        assert parse_sample_rates("debug=0.01, INFO=0.5") == {"DEBUG": 0.01, "INFO": 0.5}
+        assert parse_sample_rates("") == {}
+
+    def test_sampler_keeps_expected_fraction(self):
+        sampler = LevelSampler({"INFO": 0.1, "DEBUG": 0.0})
+        kept = sum(sampler.keep("INFO") for _ in range(100))
+        assert kept == 10
+        assert not sampler.keep("DEBUG")
+        assert sampler.keep("WARNING")
+
+    def test_sampled_out_lines_are_not_formatted(self):
+        class Exploding:
+            def __format__(self, spec):
+                raise AssertionError("formatted eagerly")
+
+        messages = []
+        sink_id = logger.add(messages.append, level="DEBUG", format="{message}")
+        try:
+            hot = HotPathLogger(LevelSampler({"INFO": 0.0}))
+            hot.info("query {}", Exploding())
+            hot.debug("kept {}", 1)
+        finally:
+            logger.remove(sink_id)
+
+        assert [message.strip() for message in messages] == ["kept 1"]
+
+
+class TestStdlibInterception:
+    """Tests for stdlib logging levels"""
+
+    def test_library_debug_records_are_not_built(self):
+        settings = SimpleNamespace(
+            log_level="INFO", log_file=None, log_json=False, log_enqueue=False,
+            log_rotation="1 MB", log_sample_rates=""
+        )
+        LoggingConfig.setup_logging(settings)
+
+        assert not logging.getLogger().isEnabledFor(logging.DEBUG)
+        assert logging.getLogger("app").isEnabledFor(logging.INFO)
+        for name in ("openai", "httpx", "httpcore", "chromadb"):
+            assert not logging.getLogger(name).isEnabledFor(logging.INFO)
@@ -0,0 +1,111 @@
+"""
+Unit Tests for memory diagnostics
+"""
+
+import numpy as np
+
+from app.rag.cache import LRUCache
+from app.rag.snapshot import load_snapshot, write_snapshot
+from utils.memory import AllocationProfiler, cache_memory, deep_sizeof, index_memory, model_memory, process_memory
+
+
+class FakeTensor:
+    """Minimal stand-in for a torch tensor"""
+
+    def __init__(self, numel: int, element_size: int = 4, dtype: str = "torch.float32"):
+        self._numel = numel
+        self._element_size = element_size
+        self.dtype = dtype
+
+    def numel(self):
+        return self._numel
+
+    def element_size(self):
+        return self._element_size
+
+
+class FakeModel:
+    def parameters(self):
+        return [FakeTensor(1000), FakeTensor(24)]
+
+    def buffers(self):
+        return [FakeTensor(512, element_size=8, dtype="torch.int64")]
+
+
+class FakeEmbeddingService:
+    model_name = "fake-model"
+    model = FakeModel()
+
+
+class TestMemoryBreakdown:
+    """Tests for the per-component breakdown"""
+
+    def test_deep_sizeof_counts_array_buffers(self):
+        array = np.zeros((100, 10), dtype=np.float32)
+        assert array.nbytes <= deep_sizeof({"vectors": array}) < 2 * array.nbytes
+
+    def test_deep_sizeof_counts_view_buffers_once(self):
+        array = np.zeros((100, 10), dtype=np.float32)
+        # A view keeps the whole buffer of its base alive
+        assert deep_sizeof({"row": array[:10]}) >= array.nbytes
+        assert deep_sizeof([array.reshape(10, 100)[:, :5]]) >= array.nbytes
+        # Shared by the base and several views, the buffer is counted once
+        assert deep_sizeof({"base": array, "views": [array[:10], array[10:20]]}) < 2 * array.nbytes
+        assert deep_sizeof([array[:10], array[10:20]]) < 2 * array.nbytes
+
+    def test_deep_sizeof_skips_memory_mapped_buffers(self, tmp_path):
+        path = str(tmp_path / "vectors.npy")
+        np.save(path, np.zeros((1000, 16), dtype=np.float32))
+        vectors = np.load(path, mmap_mode="r")
+
+        assert deep_sizeof([vectors, vectors[:10], np.asarray(vectors)]) < vectors.nbytes
+
+    def test_model_memory(self):
+        report = model_memory(FakeEmbeddingService())
+        assert report["parameters"] == 1024
+        assert report["parameter_bytes"] == 4096
+        assert report["buffer_bytes"] == 4096
+        assert report["dtypes"] == ["torch.float32"]
+
+    def test_snapshot_index_memory(self, tmp_path):
+        path = str(tmp_path / "snapshot")
+        write_snapshot(
+            path,
+            ids=[f"chunk{i}" for i in range(4)],
+            embeddings=np.ones((4, 16), dtype=np.float32),
+            documents=["texto"] * 4,
+            metadatas=[{"filename": "a.pdf", "page": i} for i in range(4)],
+            model_name="fake-model",
+            chunk_size=1000,
+            chunk_overlap=200
+        )
+        report = index_memory(load_snapshot(path))
+
+        assert report["vector_bytes"] == 4 * 16 * 4
+        assert report["vectors_memory_mapped"] is True
+        assert report["metadata_bytes"] > 0
+        assert report["estimated"] is False
+
+    def test_cache_memory(self):
+        cache = LRUCache(4)
+        cache.set("consulta", np.zeros(384, dtype=np.float32))
+        report = cache_memory(cache)
+        assert report["size"] == 1
+        assert report["approx_bytes"] >= 384 * 4
+
+    def test_process_memory(self):
+        assert process_memory()["peak_rss_bytes"] > 0
+
+
+class TestAllocationProfiler:
+    """Tests for AllocationProfiler"""
+
+    def test_reports_allocation_sites(self):
+        with AllocationProfiler("test", top_n=5) as profiler:
+            retained = [bytearray(4096) for _ in range(256)]
+
+        report = profiler.report
+        assert report["label"] == "test"
+        assert report["traced_peak_bytes"] >= 256 * 4096
+        assert report["top_allocations"][0]["location"].split(":")[0].endswith("test_memory.py")
+        assert len(retained) == 256
@@ -0,0 +1,49 @@
+"""
+Unit Tests for the multi-process embedding executor
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+from app.rag.embeddings import EmbeddingService
+from app.rag.parallel_embeddings import ParallelEmbeddingExecutor
+
+
+def _thread_settings():
+    """Thread settings seen inside a worker process"""
+    import torch
+    return os.environ.get("OMP_NUM_THREADS"), torch.get_num_threads()
+
+
+class TestParallelEmbeddingExecutor:
+    """Tests for ParallelEmbeddingExecutor"""
+
+    @pytest.fixture(scope="class")
+    def executor(self):
+        with ParallelEmbeddingExecutor("all-MiniLM-L6-v2", num_workers=2, threads_per_worker=1, shard_size=2) as executor:
+            yield executor
+
+    def test_matches_in_process_embeddings(self, executor):
+        texts = [f"Política de devolución {i}" for i in range(7)]
+        expected = EmbeddingService("all-MiniLM-L6-v2").embed_batch(texts)
+
+        embeddings = executor.embed_batch(texts)
+
+        assert embeddings.shape == (len(texts), executor.embedding_dim)
+        assert np.allclose(embeddings, expected, atol=1e-5)
+
+    def test_empty_batch(self, executor):
+        assert executor.embed_batch([]).shape == (0, executor.embedding_dim)
+
+    def test_workers_inherit_thread_settings(self, executor):
+        assert executor._executor.submit(_thread_settings).result(timeout=60) == ("1", 1)
+
+    def test_model_load_failure_is_raised(self):
+        """A worker that cannot load the model fails startup instead of hanging"""
+        previous = os.environ.get("OMP_NUM_THREADS")
+        with pytest.raises(RuntimeError, match="failed to load model"):
+            ParallelEmbeddingExecutor("/nonexistent/embedding-model", num_workers=1, threads_per_worker=1,
+                                      startup_timeout=120)
+        assert os.environ.get("OMP_NUM_THREADS") == previous
@@ -0,0 +1,60 @@
+"""
+Unit Tests for partitioned retrieval helpers
+"""
+
+import pytest
+
+from app.rag.partitioning import (
+    QueryRouter,
+    build_where_filter,
+    detect_language,
+    infer_category,
+)
+
+
+class TestPartitionMetadata:
+    """Tests for ingestion-time partition tagging"""
+
+    def test_infer_category_from_filename(self):
+        assert infer_category("Politicas_Devolucion_EcoMarket_final.pdf") == "devoluciones"
+        assert infer_category("Politica_Garantia_EcoMarket.pdf") == "garantia"
+        assert infer_category("Catalogo.pdf") == "general"
+
+    def test_detect_language(self):
+        assert detect_language("El cliente puede devolver los productos en la tienda") == "es"
+        assert detect_language("The customer can return the products to the store") == "en"
+
+
+class TestWhereFilter:
+    """Tests for ChromaDB filter translation"""
+
+    def test_empty_filters(self):
+        assert build_where_filter(None) is None
+        assert build_where_filter({"category": None}) is None
+
+    def test_single_and_combined_filters(self):
+        assert build_where_filter({"category": "garantia"}) == {"category": "garantia"}
+        assert build_where_filter({"category": ["garantia", "devoluciones"], "language": "es"}) == {
+            "$and": [
+                {"category": {"$in": ["garantia", "devoluciones"]}},
+                {"language": "es"},
+            ]
+        }
+
+    def test_unknown_field_rejected(self):
+        with pytest.raises(ValueError):
+            build_where_filter({"author": "x"})
+
+
+class TestQueryRouter:
+    """Tests for the keyword query router"""
+
+    def test_routes_unambiguous_queries(self):
+        router = QueryRouter()
+        assert router.route("¿Cuánto tiempo tengo para una devolución?") == {"category": "devoluciones"}
+        assert router.route("Mi producto llegó defectuoso, ¿cubre la garantía?") == {"category": "garantia"}
+
+    def test_ambiguous_query_not_routed(self):
+        router = QueryRouter()
+        assert router.route("Hola, ¿qué venden?") is None
+        assert router.route("¿La garantía permite devolución?") is None
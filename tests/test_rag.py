@@ -3,15 +3,45 @@ Unit Tests for RAG Components
 Sample test suite for EcoMarket RAG solution
 """
 
+import asyncio
+import uuid
+
 import pytest
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, Mock, patch
 import numpy as np
 
+from app.rag.admission import Deadline, DeadlineExceededError, StageLimiter
 from app.rag.embeddings import EmbeddingService
 from app.rag.retriever import DocumentRetriever
+from app.rag.chunking import StreamingChunker
 from app.rag.generator import ResponseGenerator
 
 
+class FakeStream:
+    """Chunk stream shaped like the SDK's AsyncStream"""
+    
+    def __init__(self, chunks, stall_after=None):
+        self._chunks = iter(chunks)
+        self._remaining = stall_after
+        self.closed = False
+    
+    def __aiter__(self):
+        return self
+    
+    async def __anext__(self):
+        if self._remaining is not None:
+            if self._remaining == 0:
+                await asyncio.sleep(10)
+            self._remaining -= 1
+        try:
+            return next(self._chunks)
+        except StopIteration:
+            raise StopAsyncIteration
+    
+    async def close(self):
+        self.closed = True
+
+
 class TestEmbeddingService:
     """Tests for EmbeddingService"""
     
@@ -60,6 +90,7 @@ class TestDocumentRetriever:
         """Create mock embedding service"""
         service = Mock(spec=EmbeddingService)
         service.embed_text.return_value = np.random.rand(384)
+        service.embed_batch.side_effect = lambda texts: np.random.rand(len(texts), 384)
         return service
     
     @pytest.mark.asyncio
@@ -84,6 +115,34 @@ class TestDocumentRetriever:
             assert 'distance' in results[0]
 
 
+class TestIngestionBatching:
+    """Tests for batched ingestion in DocumentRetriever"""
+    
+    def test_failed_flush_keeps_buffered_chunks(self):
+        """A failed embed/add raises and keeps the chunks for the next flush"""
+        service = Mock(spec=EmbeddingService)
+        service.embed_batch.side_effect = [
+            RuntimeError("embedding failed"),
+            np.random.rand(2, 384),
+        ]
+        retriever = DocumentRetriever(
+            service, collection_name=f"test_batching_{uuid.uuid4().hex}",
+            use_snapshot=False, index_on_init=False
+        )
+        retriever.ingestion_batch_size = 2
+        pages = [(1, "Devoluciones dentro de 30 días."), (2, "Garantía de dos años.")]
+        retriever.chunker = StreamingChunker(chunk_size=40, chunk_overlap=0)
+        
+        with patch("app.rag.retriever.iter_pdf_pages", return_value=iter(pages)):
+            with pytest.raises(RuntimeError, match="embedding failed"):
+                retriever._index_pdf("/docs/politicas.pdf", source="local")
+        assert len(retriever._pending_chunks) == 2
+        
+        retriever._flush_chunks()
+        assert retriever._pending_chunks == []
+        assert retriever.collection.count() == 2
+
+
 class TestResponseGenerator:
     """Tests for ResponseGenerator"""
     
@@ -110,5 +169,132 @@ class TestResponseGenerator:
             assert isinstance(response['sources'], list)
 
 
+class TestPromptLayout:
+    """Tests for the stable-prefix prompt layout"""
+    
+    @pytest.fixture
+    def generator(self):
+        """Create generator without a real LLM client"""
+        with patch.object(ResponseGenerator, 'init_client'):
+            generator = ResponseGenerator()
+        generator.client.chat.completions.create = AsyncMock()
+        yield generator
+    
+    def test_system_prefix_is_stable(self, generator):
+        """System prompt carries no per-request content"""
+        with patch.object(ResponseGenerator, 'init_client'):
+            other = ResponseGenerator()
+        assert generator.system_prompt == other.system_prompt
+        assert "{context}" not in generator.system_prompt
+    
+    @pytest.mark.asyncio
+    async def test_context_and_query_sent_once(self, generator):
+        """Context and query appear exactly once across all messages"""
+        documents = [{'content': 'Devoluciones dentro de 30 días', 'metadata': {}, 'distance': 0.1}]
+        generator.client.chat.completions.create.return_value.choices = [
+            Mock(message=Mock(content="Respuesta"))
+        ]
+        
+        response = await generator.generate("¿Plazo de devolución?", documents)
+        
+        messages = generator.client.chat.completions.create.call_args.kwargs['messages']
+        prompt_text = "".join(message['content'] for message in messages)
+        assert messages[0]['content'] == generator.system_prompt
+        assert prompt_text.count('Devoluciones dentro de 30 días') == 1
+        assert prompt_text.count('¿Plazo de devolución?') == 1
+        assert response['usage']['prompt_tokens'] > 0
+    
+    def test_citations_include_duplicate_sources(self, generator):
+        """Sources dropped as duplicates at ingestion are still cited"""
+        metadata = {
+            'filename': 'garantia.pdf', 'page': 2, 'page_end': 2,
+            'duplicate_sources': '[{"filename": "garantia_2024.pdf", "page": 3, "page_end": 4, "source": "blob"}]'
+        }
+        documents = [{'content': 'Garantía de dos años', 'metadata': metadata, 'distance': 0.1}]
+        
+        assert "also in garantia_2024.pdf, pp. 3-4" in generator._build_context(documents)
+        assert generator._format_sources(documents)[0]['also_in'] == ["garantia_2024.pdf, pp. 3-4"]
+    
+    @pytest.mark.asyncio
+    async def test_generate_stream(self, generator):
+        """Streaming yields the text deltas with the same prompt layout"""
+        def chunk(content):
+            return Mock(choices=[Mock(delta=Mock(content=content))])
+        stream = FakeStream([Mock(choices=[]), chunk("Tienes "), chunk(None), chunk("30 días.")])
+        generator.client.chat.completions.create.return_value = stream
+        documents = [{'content': 'Devoluciones dentro de 30 días', 'metadata': {}, 'distance': 0.1}]
+        
+        parts = [text async for text in generator.generate_stream("¿Plazo de devolución?", documents)]
+        
+        call = generator.client.chat.completions.create.call_args.kwargs
+        assert parts == ["Tienes ", "30 días."]
+        assert stream.closed
+        assert call['stream'] is True
+        assert call['messages'][0]['content'] == generator.system_prompt
+
+    @pytest.mark.asyncio
+    async def test_generate_stream_holds_llm_slot_and_deadline(self, generator):
+        """The llm slot is held while streaming and a stalled stream hits the deadline"""
+        def chunk(content):
+            return Mock(choices=[Mock(delta=Mock(content=content))])
+        generator.stage_limiter = StageLimiter({"llm": 1})
+        stream = FakeStream([chunk("Tienes "), chunk("30 días.")], stall_after=1)
+        generator.client.chat.completions.create.return_value = stream
+        documents = [{'content': 'Devoluciones dentro de 30 días', 'metadata': {}, 'distance': 0.1}]
+        parts = generator.generate_stream("¿Plazo de devolución?", documents, deadline=Deadline(0.2))
+        
+        assert await parts.__anext__() == "Tienes "
+        with pytest.raises(DeadlineExceededError):
+            async with generator.stage_limiter.slot("llm", Deadline(0.02)):
+                pass
+        with pytest.raises(DeadlineExceededError):
+            await parts.__anext__()
+        assert stream.closed
+        async with generator.stage_limiter.slot("llm", Deadline(0.1)):
+            pass
+
+    @pytest.mark.asyncio
+    async def test_generate_with_on_text_streams_and_returns_sources(self, generator):
+        """generate streams through on_text and still returns the full response"""
+        def chunk(content):
+            return Mock(choices=[Mock(delta=Mock(content=content))])
+        generator.client.chat.completions.create.return_value = FakeStream([chunk("Tienes "), chunk("30 días.")])
+        documents = [{'content': 'Devoluciones dentro de 30 días', 'metadata': {'filename': 'devoluciones.pdf'}, 'distance': 0.1}]
+        streamed = []
+        
+        result = await generator.generate("¿Plazo de devolución?", documents, on_text=streamed.append)
+        
+        assert streamed == ["Tienes ", "30 días."]
+        assert result['answer'] == "Tienes 30 días."
+        assert result['sources'][0]['citation'] == "devoluciones.pdf"
+        assert result['usage']['estimated'] is True
+
+    @pytest.mark.asyncio
+    async def test_cancelling_generate_stops_the_llm_call(self, generator):
+        """A cancelled request cancels its upstream call and frees the llm slot"""
+        generator.stage_limiter = StageLimiter({"llm": 1})
+        started, cancelled = asyncio.Event(), asyncio.Event()
+        
+        async def slow_create(**kwargs):
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+        
+        generator.client.chat.completions.create.side_effect = slow_create
+        documents = [{'content': 'Devoluciones dentro de 30 días', 'metadata': {}, 'distance': 0.1}]
+        task = asyncio.ensure_future(generator.generate("¿Plazo de devolución?", documents))
+        await asyncio.wait_for(started.wait(), 1)
+        task.cancel()
+        
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert cancelled.is_set()
+        async with generator.stage_limiter.slot("llm", Deadline(0.1)):
+            pass
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
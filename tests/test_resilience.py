@@ -0,0 +1,263 @@
+"""
+Unit Tests for the LLM resilience layer
+"""
+
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import Mock, patch
+
+import pytest
+
+from app.rag.admission import Deadline, DeadlineExceededError
+from app.rag.generator import ResponseGenerator
+from app.rag.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    ResilientCaller,
+    RetryPolicy,
+    retry_after_seconds,
+)
+
+
+class UpstreamError(Exception):
+    """Error shaped like the OpenAI SDK status errors"""
+
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = Mock(headers=headers or {})
+
+
+def fast_policy(**kwargs):
+    return RetryPolicy(base_delay=0.001, max_delay=0.01, **kwargs)
+
+
+class TestRetries:
+    """Tests for retries and backoff"""
+
+    def test_retry_after_header(self):
+        assert retry_after_seconds(UpstreamError(429, {"retry-after": "2"})) == 2.0
+        assert retry_after_seconds(UpstreamError(429, {"retry-after-ms": "150"})) == 0.15
+        assert retry_after_seconds(UpstreamError(429)) is None
+
+    def test_backoff_honours_retry_after(self):
+        policy = RetryPolicy(base_delay=0.1, max_delay=1.0)
+        assert policy.backoff(3) <= 0.4
+        assert policy.backoff(1, retry_after=2.0) == 2.0
+
+    @pytest.mark.asyncio
+    async def test_retries_throttled_calls(self):
+        caller = ResilientCaller(fast_policy(max_attempts=3))
+        outcomes = [UpstreamError(429, {"retry-after": "0"}), UpstreamError(503), "ok"]
+
+        async def call(timeout):
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        assert await caller.call(call) == "ok"
+        assert caller.retries == 2
+
+    @pytest.mark.asyncio
+    async def test_client_errors_are_not_retried(self):
+        caller = ResilientCaller(fast_policy(max_attempts=3))
+        calls = 0
+
+        async def call(timeout):
+            nonlocal calls
+            calls += 1
+            raise UpstreamError(400)
+
+        with pytest.raises(UpstreamError):
+            await caller.call(call)
+        assert calls == 1
+
+    @pytest.mark.asyncio
+    async def test_attempt_timeout_then_success(self):
+        caller = ResilientCaller(fast_policy(max_attempts=2, attempt_timeout=0.05))
+        delays = [1.0, 0.0]
+
+        async def call(timeout):
+            await asyncio.sleep(delays.pop(0))
+            return "ok"
+
+        assert await caller.call(call, deadline=Deadline(2.0)) == "ok"
+
+    @pytest.mark.asyncio
+    async def test_exhausted_timeouts_raise_deadline_exceeded(self):
+        caller = ResilientCaller(fast_policy(max_attempts=2, attempt_timeout=0.02))
+
+        async def call(timeout):
+            await asyncio.sleep(1.0)
+
+        with pytest.raises(DeadlineExceededError, match="timed out after 2 attempts"):
+            await caller.call(call)
+        assert caller.retries == 1
+
+
+class TestHedging:
+    """Tests for hedged requests"""
+
+    @pytest.mark.asyncio
+    async def test_slow_call_is_hedged(self):
+        caller = ResilientCaller(fast_policy(), hedge_quantile=0.95, hedge_min_samples=1)
+        caller.latencies.record(0.01)
+        delays = [1.0, 0.0]
+
+        async def call(timeout):
+            await asyncio.sleep(delays.pop(0))
+            return "hedged"
+
+        started = time.monotonic()
+        assert await caller.call(call) == "hedged"
+        assert time.monotonic() - started < 0.5
+        assert caller.hedges == 1
+
+
+class TestCircuitBreaker:
+    """Tests for the circuit breaker"""
+
+    @pytest.mark.asyncio
+    async def test_opens_and_fails_fast(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        caller = ResilientCaller(fast_policy(max_attempts=1), circuit_breaker=breaker)
+        calls = 0
+
+        async def call(timeout):
+            nonlocal calls
+            calls += 1
+            raise UpstreamError(500)
+
+        for _ in range(2):
+            with pytest.raises(UpstreamError):
+                await caller.call(call)
+        with pytest.raises(CircuitOpenError):
+            await caller.call(call)
+        assert calls == 2
+        assert breaker.state == CircuitBreaker.OPEN
+
+    @pytest.mark.asyncio
+    async def test_half_open_trial_closes_circuit(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+        breaker.record_failure()
+        await asyncio.sleep(0.02)
+        caller = ResilientCaller(fast_policy(), circuit_breaker=breaker)
+
+        async def call(timeout):
+            return "ok"
+
+        assert await caller.call(call) == "ok"
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("error", [DeadlineExceededError("Deadline exceeded waiting for llm slot"),
+                                       TypeError("bad argument")])
+    async def test_local_errors_do_not_close_half_open_circuit(self, error):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+        breaker.record_failure()
+        await asyncio.sleep(0.02)
+        caller = ResilientCaller(fast_policy(), circuit_breaker=breaker)
+
+        async def call(timeout):
+            raise error
+
+        with pytest.raises(type(error)):
+            await caller.call(call)
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+
+        async def trial(timeout):
+            return "ok"
+
+        # The trial slot was freed: the next call goes through and closes the circuit
+        assert await caller.call(trial) == "ok"
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    @pytest.mark.asyncio
+    async def test_upstream_client_error_closes_half_open_circuit(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+        breaker.record_failure()
+        await asyncio.sleep(0.02)
+        caller = ResilientCaller(fast_policy(), circuit_breaker=breaker)
+
+        async def call(timeout):
+            raise UpstreamError(400)
+
+        with pytest.raises(UpstreamError):
+            await caller.call(call)
+        assert breaker.state == CircuitBreaker.CLOSED
+
+
+class FakeChatCompletions(BaseHTTPRequestHandler):
+    """Local fake of the chat completions endpoint: throttles the first call"""
+
+    requests = 0
+
+    def do_POST(self):
+        type(self).requests += 1
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if type(self).requests == 1:
+            self.send_response(429)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Type", "application/json")
+            body = {"error": {"message": "Too many requests", "code": "429"}}
+        else:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            body = {
+                "id": "chatcmpl-1",
+                "object": "chat.completion",
+                "created": 0,
+                "model": "fake",
+                "choices": [{
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": "Tiene 30 días para devolver su compra."}
+                }],
+                "usage": {"prompt_tokens": 120, "completion_tokens": 10, "total_tokens": 130}
+            }
+        payload = json.dumps(body).encode()
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestFakeServer:
+    """End-to-end test of ResponseGenerator against a local fake LLM server"""
+
+    @pytest.fixture
+    def fake_server(self):
+        FakeChatCompletions.requests = 0
+        server = ThreadingHTTPServer(("127.0.0.1", 0), FakeChatCompletions)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        yield f"http://127.0.0.1:{server.server_port}"
+        server.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_generate_retries_throttled_upstream(self, fake_server):
+        from openai import AsyncAzureOpenAI
+
+        with patch.object(ResponseGenerator, 'init_client'):
+            generator = ResponseGenerator()
+        generator.client = AsyncAzureOpenAI(
+            azure_endpoint=fake_server,
+            api_key="test",
+            api_version="2024-06-01",
+            max_retries=0
+        )
+        generator.resilient_caller.retry_policy = fast_policy(max_attempts=3, attempt_timeout=5)
+        documents = [{'content': 'Devoluciones dentro de 30 días', 'metadata': {}, 'distance': 0.1}]
+
+        response = await generator.generate("¿Plazo de devolución?", documents, deadline=Deadline(10))
+
+        assert response['answer'] == "Tiene 30 días para devolver su compra."
+        assert response['usage']['prompt_tokens'] == 120
+        assert FakeChatCompletions.requests == 2
+        assert generator.resilient_caller.retries == 1
@@ -0,0 +1,105 @@
+"""
+Unit Tests for index snapshots
+"""
+
+import os
+
+import numpy as np
+import pytest
+from loguru import logger
+
+from app.rag.snapshot import NORMS_FILE, SnapshotMismatchError, load_snapshot, write_snapshot
+
+
+@pytest.fixture
+def snapshot_dir(tmp_path):
+    """Write a small snapshot with two partitions"""
+    rng = np.random.default_rng(0)
+    embeddings = rng.random((6, 8), dtype=np.float32)
+    metadatas = [
+        {"filename": "garantia.pdf", "category": "garantia" if i < 3 else "devoluciones", "page": i + 1}
+        for i in range(6)
+    ]
+    path = tmp_path / "snapshot"
+    write_snapshot(
+        str(path),
+        ids=[f"chunk{i}" for i in range(6)],
+        embeddings=embeddings,
+        documents=[f"texto {i}" for i in range(6)],
+        metadatas=metadatas,
+        model_name="all-MiniLM-L6-v2",
+        chunk_size=1000,
+        chunk_overlap=200
+    )
+    return path, embeddings
+
+
+class TestSnapshot:
+    """Tests for snapshot write/load and search"""
+
+    def test_vectors_are_memory_mapped(self, snapshot_dir):
+        path, embeddings = snapshot_dir
+        collection = load_snapshot(str(path), expected_model="all-MiniLM-L6-v2")
+
+        assert isinstance(collection.vectors, np.memmap)
+        assert collection.count() == 6
+        assert collection.manifest["chunk_size"] == 1000
+
+    def test_norms_are_precomputed_and_memory_mapped(self, snapshot_dir):
+        path, embeddings = snapshot_dir
+        collection = load_snapshot(str(path))
+
+        assert isinstance(collection._squared_norms, np.memmap)
+        np.testing.assert_allclose(collection._squared_norms, np.sum(embeddings ** 2, axis=1), rtol=1e-5)
+
+    def test_snapshot_without_norms_still_loads(self, snapshot_dir):
+        path, embeddings = snapshot_dir
+        os.remove(os.path.join(str(path), NORMS_FILE))
+
+        results = load_snapshot(str(path)).query(query_embeddings=[embeddings[2].tolist()], n_results=1)
+
+        assert results["ids"][0] == ["chunk2"]
+
+    def test_query_returns_nearest_with_l2_distance(self, snapshot_dir):
+        path, embeddings = snapshot_dir
+        collection = load_snapshot(str(path))
+
+        results = collection.query(query_embeddings=[embeddings[4].tolist()], n_results=2)
+
+        assert results["ids"][0][0] == "chunk4"
+        assert results["distances"][0][0] == pytest.approx(0.0, abs=1e-5)
+        expected = float(np.sum((embeddings[results_index(results)] - embeddings[4]) ** 2))
+        assert results["distances"][0][1] == pytest.approx(expected, rel=1e-4)
+
+    def test_query_filters_partition(self, snapshot_dir):
+        path, embeddings = snapshot_dir
+        collection = load_snapshot(str(path))
+
+        results = collection.query(query_embeddings=[embeddings[4].tolist()], n_results=3,
+                                   where={"category": "garantia"})
+
+        assert {metadata["category"] for metadata in results["metadatas"][0]} == {"garantia"}
+
+    def test_mismatched_chunking_is_reported(self, snapshot_dir):
+        path, _ = snapshot_dir
+        messages = []
+        sink_id = logger.add(messages.append, level="WARNING", format="{message}")
+        try:
+            load_snapshot(str(path), expected_chunk_size=1000, expected_chunk_overlap=200)
+            assert messages == []
+            collection = load_snapshot(str(path), expected_chunk_size=500, expected_chunk_overlap=200)
+        finally:
+            logger.remove(sink_id)
+
+        assert collection.count() == 6
+        assert len(messages) == 1
+        assert "chunk_size=1000" in messages[0]
+
+    def test_mismatched_model_is_refused(self, snapshot_dir):
+        path, _ = snapshot_dir
+        with pytest.raises(SnapshotMismatchError):
+            load_snapshot(str(path), expected_model="paraphrase-multilingual-MiniLM-L12-v2")
+
+
+def results_index(results):
+    return int(results["ids"][0][1].replace("chunk", ""))
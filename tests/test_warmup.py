@@ -0,0 +1,131 @@
+"""
+Unit Tests for cache warm-up and the LRU cache
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from app.rag.cache import LRUCache
+from app.rag.warmup import CacheWarmer, HotQueryTracker, load_warmup_queries
+
+
+class TestLRUCache:
+    """Tests for LRUCache"""
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.stats()["size"] == 2
+
+    def test_zero_size_disables_cache(self):
+        cache = LRUCache(0)
+        cache.set("a", 1)
+        assert cache.get("a") is None
+        assert len(cache) == 0
+
+
+class TestHotQueries:
+    """Tests for hot set tracking, export and loading"""
+
+    def test_export_round_trip(self, tmp_path):
+        tracker = HotQueryTracker()
+        for _ in range(3):
+            tracker.record("¿Plazo de devolución?", top_k=3)
+        tracker.record("Garantía de electrodomésticos", top_k=5)
+        path = tmp_path / "hot_queries.jsonl"
+
+        assert tracker.export(str(path), 10) == 2
+        entries = load_warmup_queries(str(path))
+
+        assert entries[0]["query"] == "¿Plazo de devolución?"
+        assert entries[0]["count"] == 3
+        assert entries[1]["top_k"] == 5
+
+    def test_plain_text_queries_are_deduplicated(self, tmp_path):
+        path = tmp_path / "queries.txt"
+        path.write_text("Política de garantía\n# comentario\npolítica  de GARANTÍA\n\nEnvíos\n", encoding="utf-8")
+
+        assert [entry["query"] for entry in load_warmup_queries(str(path))] == ["Política de garantía", "Envíos"]
+        assert len(load_warmup_queries(str(path), limit=1)) == 1
+
+    def test_seeded_counts_survive_export(self, tmp_path):
+        path = tmp_path / "hot_queries.jsonl"
+        previous = HotQueryTracker()
+        for _ in range(5):
+            previous.record("Plazo de devolución", top_k=3)
+        previous.export(str(path), 10)
+
+        tracker = HotQueryTracker()
+        tracker.seed(load_warmup_queries(str(path)))
+        tracker.record("Envíos internacionales", top_k=4)
+        tracker.record("Plazo de devolución", top_k=3)
+        tracker.export(str(path), 10)
+
+        entries = load_warmup_queries(str(path))
+        assert [(entry["query"], entry["count"]) for entry in entries] == [
+            ("Plazo de devolución", 6), ("Envíos internacionales", 1)
+        ]
+        assert entries[0]["top_k"] == 3
+
+    def test_filters_and_temperature_are_kept_per_entry(self, tmp_path):
+        tracker = HotQueryTracker()
+        tracker.record("Plazo de garantía", top_k=3, temperature=0.2, category="garantia", language=None)
+        tracker.record("plazo de GARANTÍA", top_k=3, temperature=0.2, category="garantia", language=None)
+        tracker.record("Plazo de garantía", top_k=3, temperature=0.7, category=None, language=None)
+        path = tmp_path / "hot_queries.jsonl"
+        tracker.export(str(path), 10)
+
+        entries = load_warmup_queries(str(path))
+
+        assert entries == [
+            {"query": "plazo de GARANTÍA", "top_k": 3, "temperature": 0.2, "category": "garantia", "count": 2},
+            {"query": "Plazo de garantía", "top_k": 3, "temperature": 0.7, "count": 1},
+        ]
+
+    def test_malformed_lines_are_skipped(self, tmp_path):
+        path = tmp_path / "hot_queries.jsonl"
+        path.write_text(
+            '{"query": "Envíos", "top_k": 3, "count": 2}\n'
+            '{"query": "Garantía", "top_k": 3\n'
+            '{"top_k": 3}\n'
+            '{"query": "Devoluciones", "top_k": 3, "count": 1}\n',
+            encoding="utf-8"
+        )
+
+        assert [entry["query"] for entry in load_warmup_queries(str(path))] == ["Envíos", "Devoluciones"]
+
+
+class TestCacheWarmer:
+    """Tests for CacheWarmer"""
+
+    @pytest.mark.asyncio
+    async def test_warms_with_bounded_concurrency(self):
+        running = 0
+        peak = 0
+
+        async def warm(entry):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            if entry["query"] == "falla":
+                raise RuntimeError("upstream down")
+
+        warmer = CacheWarmer(warm, concurrency=2)
+        entries = [{"query": f"consulta {i}"} for i in range(5)] + [{"query": "falla"}]
+
+        stats = await warmer.warm(entries)
+
+        assert peak <= 2
+        assert stats.status == "completed"
+        assert (stats.total, stats.warmed, stats.failed) == (6, 5, 1)
+        assert stats.duration_seconds > 0
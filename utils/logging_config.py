@@ -1,40 +1,153 @@
 
+import inspect
 import logging
+import math
 import os
-import logging.config
+import sys
+import threading
+from typing import Dict, Optional
+
+from loguru import logger
+
+
+def parse_sample_rates(spec: Optional[str]) -> Dict[str, float]:
+    """Parse a "DEBUG=0.01,INFO=0.1" spec into a level -> rate mapping"""
+    rates = {}
+    for item in (spec or "").split(","):
+        if not item.strip():
+            continue
+        level, _, rate = item.partition("=")
+        rates[level.strip().upper()] = min(1.0, max(0.0, float(rate)))
+    return rates
+
+
+class LevelSampler:
+    """
+    Deterministic per-level sampler for hot-path log lines
+
+    A rate of 0.1 keeps every tenth line of that level; levels without a
+    rate are always kept.
+    """
+
+    def __init__(self, rates: Optional[Dict[str, float]] = None):
+        self.rates = rates or {}
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def keep(self, level: str) -> bool:
+        rate = self.rates.get(level)
+        if rate is None or rate >= 1.0:
+            return True
+        if rate <= 0.0:
+            return False
+        with self._lock:
+            count = self._counts.get(level, 0) + 1
+            self._counts[level] = count
+        return math.floor(count * rate) > math.floor((count - 1) * rate)
+
+
+class HotPathLogger:
+    """
+    Sampled, lazily formatted logger for per-request lines
+
+    Messages use loguru brace formatting; arguments are only formatted when
+    the line passes both the level threshold and the sampler.
+    """
+
+    def __init__(self, sampler: Optional[LevelSampler] = None):
+        self.sampler = sampler or LevelSampler()
+        self.min_level_no = 0
+
+    def log(self, level: str, message: str, *args, **kwargs):
+        if logger.level(level).no < self.min_level_no or not self.sampler.keep(level):
+            return
+        logger.opt(depth=2).bind(hot_path=True).log(level, message, *args, **kwargs)
+
+    def debug(self, message: str, *args, **kwargs):
+        self.log("DEBUG", message, *args, **kwargs)
+
+    def info(self, message: str, *args, **kwargs):
+        self.log("INFO", message, *args, **kwargs)
+
+
+hot_logger = HotPathLogger()
+
+
+class InterceptHandler(logging.Handler):
+    """Routes stdlib logging records (uvicorn, chromadb, ...) into loguru"""
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            level = logger.level(record.levelname).name
+        except ValueError:
+            level = record.levelno
+        # Find the caller outside the logging module so loguru reports the right origin
+        frame, depth = inspect.currentframe(), 0
+        while frame and (depth == 0 or frame.f_code.co_filename == logging.__file__):
+            frame = frame.f_back
+            depth += 1
+        logger.opt(depth=depth, exception=record.exc_info).log(level, record.getMessage())
+
 
 class LoggingConfig:
-    LOG_DIR = os.path.join(os.path.dirname(__file__), '..', 'logs')
-    os.makedirs(LOG_DIR, exist_ok=True)
-    LOG_FILE = os.path.join(LOG_DIR, 'execution.log')
-
-    LOGGING_CONFIG = {
-        'version': 1,
-        'disable_existing_loggers': False,
-        'formatters': {
-            'default': {
-                'format': '[%(asctime)s] %(levelname)s %(name)s: %(message)s',
-            },
-        },
-        'handlers': {
-            'file': {
-                'class': 'logging.FileHandler',
-                'filename': LOG_FILE,
-                'formatter': 'default',
-                'level': 'INFO',
-            },
-            'console': {
-                'class': 'logging.StreamHandler',
-                'formatter': 'default',
-                'level': 'INFO',
-            },
-        },
-        'root': {
-            'handlers': ['file', 'console'],
-            'level': 'INFO',
-        },
-    }
+    # Libraries that build expensive DEBUG records (full request options, transport traces) per call
+    NOISY_LOGGERS = ("openai", "httpx", "httpcore", "chromadb", "urllib3", "azure")
+    CONSOLE_FORMAT = "<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | <level>{level: <8}</level> | {name}:{function}:{line} - {message}"
 
     @staticmethod
-    def setup_logging():
-        logging.config.dictConfig(LoggingConfig.LOGGING_CONFIG)
\ No newline at end of file
+    def setup_logging(settings=None):
+        """
+        Configure the single logging layer of the application
+
+        All sinks are queue-backed (enqueue=True): the request thread only
+        pushes the record, formatting and I/O happen on loguru's writer thread.
+        Stdlib logging is intercepted so every library ends up in the same sinks.
+
+        Args:
+            settings: Application settings (log_level, log_file, log_json,
+                log_enqueue, log_sample_rates, log_rotation)
+        """
+        if settings is None:
+            from app.config.settings import get_settings
+            settings = get_settings()
+
+        level = settings.log_level.upper()
+        logger.remove()
+        logger.add(
+            sys.stderr,
+            level=level,
+            format=LoggingConfig.CONSOLE_FORMAT,
+            serialize=settings.log_json,
+            enqueue=settings.log_enqueue,
+            backtrace=False,
+            diagnose=False,
+        )
+        if settings.log_file:
+            log_dir = os.path.dirname(settings.log_file)
+            if log_dir:
+                os.makedirs(log_dir, exist_ok=True)
+            logger.add(
+                settings.log_file,
+                level=level,
+                serialize=settings.log_json,
+                enqueue=settings.log_enqueue,
+                rotation=settings.log_rotation,
+                backtrace=False,
+                diagnose=False,
+            )
+
+        hot_logger.sampler = LevelSampler(parse_sample_rates(settings.log_sample_rates))
+        hot_logger.min_level_no = logger.level(level).no
+
+        # Filter in stdlib before a record is built, not in loguru after interception
+        stdlib_level = logging.getLevelName(level)
+        if not isinstance(stdlib_level, int):
+            # loguru-only levels (TRACE, SUCCESS)
+            stdlib_level = logging.DEBUG if level == "TRACE" else logging.INFO
+        logging.basicConfig(handlers=[InterceptHandler()], level=stdlib_level, force=True)
+        for name in LoggingConfig.NOISY_LOGGERS:
+            logging.getLogger(name).setLevel(max(stdlib_level, logging.WARNING))
+        for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+            logging.getLogger(name).handlers = [InterceptHandler()]
+            logging.getLogger(name).propagate = False
+        logger.info("Logging initialized (level={}, json={})", level, settings.log_json)
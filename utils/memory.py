@@ -0,0 +1,275 @@
+"""
+Memory Diagnostics Module
+Attributes process memory to the embedding model, the index, caches and allocation sites
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from loguru import logger
+
+
+def deep_sizeof(obj: Any, _seen: Optional[set] = None) -> int:
+    """
+    Approximate bytes held by an object graph
+
+    Follows containers and instance attributes. A numpy array counts its
+    buffer; a view counts the buffer of the array it keeps alive, once per
+    call even when several views share it; memory maps of a file count only
+    their header.
+
+    Args:
+        obj: Object to measure
+
+    Returns:
+        Size in bytes, each object counted once
+    """
+    seen = _seen if _seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    if isinstance(obj, np.ndarray):
+        # Includes the buffer of arrays that own their data
+        size = sys.getsizeof(obj)
+        if obj.base is None or isinstance(obj, np.memmap):
+            return size
+        root = obj.base
+        while isinstance(root, np.ndarray) and root.base is not None and not isinstance(root, np.memmap):
+            root = root.base
+        if isinstance(root, np.memmap):
+            return size
+        return size + deep_sizeof(root, seen)
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (str, bytes, bytearray, int, float, bool, type(None))):
+        return size
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(key, seen) + deep_sizeof(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif hasattr(obj, "__dict__"):
+        size += deep_sizeof(vars(obj), seen)
+    return size
+
+
+def process_memory() -> Dict[str, Optional[int]]:
+    """Resident set size and its peak, in bytes"""
+    rss = peak = None
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    rss = int(line.split()[1]) * 1024
+                elif line.startswith("VmHWM:"):
+                    peak = int(line.split()[1]) * 1024
+    except OSError:
+        try:
+            import resource
+            max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            # Reported in bytes on macOS, kilobytes elsewhere
+            peak = max_rss if sys.platform == "darwin" else max_rss * 1024
+        except ImportError:
+            pass
+    return {"rss_bytes": rss, "peak_rss_bytes": peak}
+
+
+def model_memory(embedding_service: Any) -> Dict[str, Any]:
+    """
+    Parameter and buffer bytes of the torch model behind an embedding service
+
+    Args:
+        embedding_service: EmbeddingService or EmbeddingHuggingFaceService
+
+    Returns:
+        Model memory breakdown
+    """
+    model = getattr(embedding_service, "model", None)
+    report = {
+        "model_name": getattr(embedding_service, "model_name", None),
+        "parameters": 0,
+        "parameter_bytes": 0,
+        "buffer_bytes": 0,
+        "dtypes": [],
+    }
+    if model is None or not hasattr(model, "parameters"):
+        return report
+    dtypes = set()
+    for parameter in model.parameters():
+        report["parameters"] += parameter.numel()
+        report["parameter_bytes"] += parameter.numel() * parameter.element_size()
+        dtypes.add(str(parameter.dtype))
+    for buffer in getattr(model, "buffers", list)():
+        report["buffer_bytes"] += buffer.numel() * buffer.element_size()
+    report["dtypes"] = sorted(dtypes)
+    return report
+
+
+def index_memory(collection: Any, sample_size: int = 1000) -> Dict[str, Any]:
+    """
+    Vector and metadata bytes of the index
+
+    Snapshot collections are measured exactly. For ChromaDB collections a
+    sample of chunks is measured and extrapolated to the collection size,
+    with vectors stored as float32.
+
+    Args:
+        collection: ChromaDB collection or SnapshotCollection
+        sample_size: Chunks measured for ChromaDB collections
+
+    Returns:
+        Index memory breakdown
+    """
+    count = collection.count()
+    vectors = getattr(collection, "vectors", None)
+    if vectors is not None:
+        return {
+            "backend": "snapshot",
+            "count": count,
+            "embedding_dim": int(vectors.shape[1]) if vectors.ndim == 2 else None,
+            "vector_bytes": int(vectors.nbytes),
+            # Memory-mapped pages are file backed and shared between workers
+            "vectors_memory_mapped": isinstance(vectors, np.memmap),
+            "document_bytes": deep_sizeof(collection.documents),
+            "metadata_bytes": deep_sizeof(collection.metadatas) + deep_sizeof(collection.ids),
+            "estimated": False,
+        }
+
+    report = {
+        "backend": "chromadb",
+        "count": count,
+        "embedding_dim": None,
+        "vector_bytes": 0,
+        "vectors_memory_mapped": False,
+        "document_bytes": 0,
+        "metadata_bytes": 0,
+        "estimated": True,
+    }
+    if count == 0:
+        return report
+    sample = collection.get(limit=sample_size, include=["embeddings", "documents", "metadatas"])
+    sampled = len(sample["ids"])
+    embeddings = sample.get("embeddings")
+    if sampled and embeddings is not None and len(embeddings):
+        report["embedding_dim"] = len(embeddings[0])
+        report["vector_bytes"] = count * report["embedding_dim"] * np.dtype(np.float32).itemsize
+    if sampled:
+        scale = count / sampled
+        report["document_bytes"] = int(deep_sizeof(sample.get("documents") or []) * scale)
+        report["metadata_bytes"] = int(
+            (deep_sizeof(sample.get("metadatas") or []) + deep_sizeof(sample["ids"])) * scale
+        )
+    return report
+
+
+def cache_memory(cache: Any) -> Dict[str, Any]:
+    """Counters and approximate bytes of an LRUCache"""
+    return {**cache.stats(), "approx_bytes": deep_sizeof(cache.items())}
+
+
+class AllocationProfiler:
+    """
+    tracemalloc-based profiler reporting the top allocation sites of a code block
+
+    Used as a context manager. The report lists the source lines whose
+    allocations are still alive at the end of the block, largest first, and
+    the peak traced memory reached inside it.
+    """
+
+    # Allocations made by the profiler itself or by the import machinery
+    IGNORED_FILES = (tracemalloc.__file__, "<frozen importlib._bootstrap>",
+                     "<frozen importlib._bootstrap_external>", "<unknown>")
+
+    def __init__(self, label: str, top_n: int = 15, frames: int = 1):
+        """
+        Initialize the profiler
+
+        Args:
+            label: Name of the profiled block, used in logs and the report
+            top_n: Allocation sites reported
+            frames: Stack frames stored per allocation
+        """
+        self.label = label
+        self.top_n = top_n
+        self.frames = frames
+        self.report: Optional[Dict[str, Any]] = None
+        self._started_tracing = False
+        self._baseline = None
+        self._started = 0.0
+
+    def __enter__(self) -> "AllocationProfiler":
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started_tracing = True
+        tracemalloc.reset_peak()
+        self._baseline = tracemalloc.take_snapshot()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._started
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        if self._started_tracing:
+            tracemalloc.stop()
+
+        filters = [tracemalloc.Filter(False, pattern) for pattern in self.IGNORED_FILES]
+        differences = snapshot.filter_traces(filters).compare_to(self._baseline.filter_traces(filters), "lineno")
+        top: List[Dict[str, Any]] = []
+        for stat in differences:
+            if stat.size_diff <= 0:
+                continue
+            frame = stat.traceback[0]
+            filename = frame.filename
+            if filename.startswith(os.getcwd() + os.sep):
+                filename = os.path.relpath(filename)
+            top.append({
+                "location": f"{filename}:{frame.lineno}",
+                "size_bytes": stat.size_diff,
+                "blocks": stat.count_diff,
+            })
+            if len(top) >= self.top_n:
+                break
+        self.report = {
+            "label": self.label,
+            "duration_seconds": round(duration, 3),
+            "traced_current_bytes": current,
+            "traced_peak_bytes": peak,
+            "top_allocations": top,
+        }
+        logger.info(
+            "Memory profile '{}': peak {:.1f} MiB traced in {:.1f}s",
+            self.label, peak / 2 ** 20, duration
+        )
+        for entry in top:
+            logger.info("  {:>10.1f} KiB  {}", entry["size_bytes"] / 1024, entry["location"])
+        self._baseline = None
+        return False
+
+
+def memory_report(embedding_service: Any = None, collection: Any = None,
+                  caches: Optional[Dict[str, Any]] = None,
+                  profiles: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Memory breakdown of the running service
+
+    Args:
+        embedding_service: Query embedding service
+        collection: Index collection
+        caches: LRUCache instances by name
+        profiles: Latest AllocationProfiler reports by name
+
+    Returns:
+        Breakdown by component, in bytes
+    """
+    return {
+        "process": process_memory(),
+        "model": model_memory(embedding_service) if embedding_service is not None else None,
+        "index": index_memory(collection) if collection is not None else None,
+        "caches": {name: cache_memory(cache) for name, cache in (caches or {}).items() if cache is not None},
+        "tracemalloc_active": tracemalloc.is_tracing(),
+        "profiles": profiles or {},
+    }